@@ -0,0 +1,182 @@
+'''
+Created on Oct 2026
+
+Offline benchmarks of the crawlers, run against the synthetic wikis of mock_mediawiki.py at
+several sizes. Each benchmark prepares its input (e.g., the crawls compared by get_common_pages),
+then measures a single step: wall time, throughput (items per second), number of API requests
+received by the mock server and peak memory allocated by Python (tracemalloc). The results can be
+saved as JSON and compared with those of a previous run, to spot regressions before a production run.
+'''
+import argparse
+import importlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import wikipedia
+
+import common_link_crawler
+import compute_readability
+import corpus_export
+import wiki_client
+import wiki_crawler_desira
+from mock_mediawiki import MockMediaWikiProcess, SyntheticWiki
+from wiki_crawler_desira import CategoryCrawler
+
+# sizes of the synthetic wikis: each portal has fanout + fanout^2 + ... + fanout^depth subcategories
+SIZES = {
+    'small': {'fanout': 3, 'depth': 2, 'pages_per_category': 5, 'cycles': 2},
+    'medium': {'fanout': 4, 'depth': 3, 'pages_per_category': 10, 'cycles': 5},
+    'large': {'fanout': 6, 'depth': 3, 'pages_per_category': 20, 'cycles': 10}
+}
+BENCHMARKS = ('crawl', 'crawl_concurrent', 'common_pages', 'common_linked_pages', 'readability')
+DEFAULT_TOLERANCE = 0.2 #relative slowdown reported as a regression
+
+
+def _use_api(api_url):
+    '''
+    Points all the scripts, and the wikipedia library, to the given API, with fresh clients.
+    '''
+    wiki_crawler_desira.API_URL = api_url
+    compute_readability.API_URL = api_url
+    wikipedia.wikipedia.API_URL = api_url
+    wikipedia.search.clear_cache()
+    wiki_client.configure(cache=None, max_rate=None)
+
+
+def _crawl(portal, depth, include_pages=False, node_type='url', workers=1):
+    category_crawler = CategoryCrawler(portal)
+    if workers > 1:
+        category_crawler.search_and_store_graph_concurrent(portal, subcategory_depth=depth, include_pages=include_pages, node_type=node_type, workers=workers)
+    else:
+        category_crawler.search_and_store_graph(portal, subcategory_depth=depth, include_pages=include_pages, node_type=node_type)
+    return category_crawler
+
+
+def _prepare(benchmark, wiki, depth, work_dir):
+    '''
+    Returns the function measured by the benchmark, which returns the number of items it processed.
+    '''
+    # libraries imported by the crawlers and by the scoring on first use: loaded here, so that the benchmarks do not measure them
+    for module_name in ('networkx', 'numpy', 'dump_backend'):
+        importlib.import_module(module_name)
+    portal_A, portal_B = wiki.roots[:2]
+
+    if benchmark == 'crawl':
+        return lambda: _crawl(portal_A, depth).get_category_graph().number_of_nodes()
+    if benchmark == 'crawl_concurrent':
+        return lambda: _crawl(portal_A, depth, workers=wiki_crawler_desira.DEFAULT_WORKERS).get_category_graph().number_of_nodes()
+
+    if benchmark in ('common_pages', 'common_linked_pages'):
+        include_pages = benchmark == 'common_linked_pages'
+        crawler_A = _crawl(portal_A, depth, include_pages=include_pages, node_type='name')
+        crawler_B = _crawl(portal_B, depth, include_pages=include_pages, node_type='name')
+        get_common = common_link_crawler.get_common_pages if benchmark == 'common_pages' else common_link_crawler.get_common_linked_pages
+
+        def compare():
+            get_common(crawler_A, crawler_B)
+            return crawler_A.get_category_graph().number_of_nodes() + crawler_B.get_category_graph().number_of_nodes()
+        return compare
+
+    if benchmark == 'readability':
+        corpus_dir = os.path.join(work_dir, 'corpus')
+        corpus_export.export_corpus(_crawl(portal_A, depth, include_pages=True).get_category_graph(), corpus_dir)
+        return lambda: compute_readability.score_corpus(corpus_dir, os.path.join(work_dir, 'scores.csv'), processes=1)
+
+    raise ValueError('unknown benchmark %s' % benchmark)
+
+
+def run_benchmark(benchmark, size, latency=0.0):
+    '''
+    Runs a benchmark against a new mock server serving the synthetic wiki of the given size. The server
+    runs in a child process, so that only the code under test is measured.
+    :return: dictionary with benchmark, size, seconds, items, items_per_second, requests and peak_memory_mb
+    '''
+    wiki = SyntheticWiki(**SIZES[size]) #the same wiki served by the child process, for the titles of the portals
+    mock = MockMediaWikiProcess(SIZES[size], latency)
+    _use_api(mock.start())
+    work_dir = tempfile.mkdtemp(prefix='desira_benchmark_')
+
+    try:
+        measured = _prepare(benchmark, wiki, SIZES[size]['depth'], work_dir)
+
+        requests_before = mock.requests
+        tracemalloc.start()
+        start = time.perf_counter()
+        items = measured()
+        seconds = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {'benchmark': benchmark, 'size': size, 'seconds': seconds, 'items': items,
+            'items_per_second': items / seconds if seconds > 0 else None,
+            'requests': mock.requests - requests_before, 'peak_memory_mb': peak_memory / 2 ** 20}
+
+
+def find_regressions(results, baseline_results, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Compares the results with those of a previous run: a benchmark regresses if it is slower than
+    the baseline by more than tolerance, or if it sends more requests.
+    :return: list of messages, one per regression
+    '''
+    baseline = dict(((result['benchmark'], result['size']), result) for result in baseline_results)
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['size']))
+        if previous is None:
+            continue
+        if result['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append('%s %s: %.3fs, %.3fs in the baseline' % (result['benchmark'], result['size'], result['seconds'], previous['seconds']))
+        if result['requests'] > previous['requests']:
+            regressions.append('%s %s: %d requests, %d in the baseline' % (result['benchmark'], result['size'], result['requests'], previous['requests']))
+    return regressions
+
+
+#Call e.g.: python benchmark_crawlers.py --sizes small medium --latency 0.01 --out benchmark.json
+#and, after a change: python benchmark_crawlers.py --sizes small medium --latency 0.01 --baseline benchmark.json
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawlers against a local mock of the MediaWiki API.')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'], help='sizes of the synthetic wikis')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds waited by the mock server before each answer')
+    parser.add_argument('--out', default=None, help='JSON file where the results are saved')
+    parser.add_argument('--baseline', default=None, help='JSON results of a previous run: regressions make the script exit with status 1')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    # the per-node logging of the crawlers would dominate the timings
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    print('%-20s %-7s %10s %8s %12s %9s %10s' % ('benchmark', 'size', 'seconds', 'items', 'items/sec', 'requests', 'peak MB'))
+    for size in args.sizes:
+        for benchmark in args.benchmarks:
+            result = run_benchmark(benchmark, size, args.latency)
+            results.append(result)
+            print('%-20s %-7s %10.3f %8d %12.1f %9d %10.2f' % (benchmark, size, result['seconds'], result['items'],
+                                                               result['items_per_second'] or 0, result['requests'], result['peak_memory_mb']))
+
+    if args.out is not None:
+        with open(args.out, 'w', encoding='utf-8') as out_file:
+            json.dump(results, out_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print('Regression: ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
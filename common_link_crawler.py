@@ -3,34 +3,59 @@
 
 #2. Given the common pages above, consider their category, and return the categories
 # related to that one.
-import sys
-
-import wikipedia
-from wikipedia.exceptions import PageError, DisambiguationError
-import networkx as nx
+import argparse
+import csv
+import heapq
+import json
+import logging
+import math
+import re
+import time
 
 #Given a wikipedia portal name, it returns the main pages associated to the categories of the portal.
-from wiki_crawler_desira import CategoryCrawler
-
-
-def get_page_from_node(category_name):
+from wiki_crawler_desira import CategoryCrawler, MAX_IDS_PER_QUERY
+from wiki_backend import PageNotFound
+import crawl_stats
+from crawl_stats import stats
+import seen_filter
+from seen_filter import make_seen_filter
+import wiki_backend
+import wiki_cache
+import wiki_client
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_FIELDS = ('source', 'link', 'page', 'category', 'url') #fields of the records of iter_link_overlap
+
+# scoring of the links in the prioritized search
+GENERIC_LINK = re.compile(r'^(\d{1,4}s?( BC| AD)?|\d{1,2}(st|nd|rd|th) century|(January|February|March|April|May|June|July|August|September|October|November|December)( \d{1,2})?|(List|Index|Outline|Glossary|Timeline) of .*)$')
+GENERIC_LINK_SCORE = -1.0 #score of years, dates and lists, resolved last
+STOPWORDS = frozenset(('a', 'an', 'and', 'by', 'for', 'from', 'in', 'of', 'on', 'or', 'the', 'to', 'with'))
+LINK_COUNT_WEIGHT = 0.1 #weight of log(number of source pages linking the page) in the score of a link
+HIT_RATE_WEIGHT = 0.5 #weight of the hit rate of the words of a link among the links already resolved
+
+
+def get_page_from_node(category_name, backend=None):
+    # backend: wiki_backend.WikiBackend answering the query (e.g., the one of a CategoryCrawler), None for the wikipedia library
+    get_page = wiki_client.get_wikipedia().page if backend is None else backend.get_page
     try:
-        if category_name.startswith('Category:'):
-            wiki_page = wikipedia.page(category_name[len('Category:'):])
-        else:
-            wiki_page = wikipedia.page(category_name)
+        with stats.timer('get_page_from_node'):
+            if category_name.startswith('Category:'):
+                wiki_page = get_page(category_name[len('Category:'):])
+            else:
+                wiki_page = get_page(category_name)
     except Exception:
         raise
     return wiki_page
 
 
-def get_links_from_page(page_name):
+def get_links_from_page(page_name, backend=None):
     links = []
 
     try:
-        links = get_page_from_node(page_name).links
+        links = get_page_from_node(page_name, backend).links
     except Exception:
-        print("Title or links unavailable")
+        logger.warning("Title or links unavailable for %s", page_name)
 
     return links
 
@@ -45,6 +70,29 @@ def print_categories_of_page(page):
     for cat in page.categories:
         print(cat)
 
+def normalize_category_title(category_title):
+    '''
+    Normalizes a category title the way MediaWiki does, so that titles coming from the category
+    graphs and from the page categories can be compared: the 'Category:' prefix is removed,
+    underscores and repeated spaces become single spaces, and the first letter is uppercase.
+    '''
+    if category_title.startswith('Category:'):
+        category_title = category_title[len('Category:'):]
+    category_title = ' '.join(category_title.replace('_', ' ').split())
+    return category_title[:1].upper() + category_title[1:]
+
+def get_category_index(category_crawler):
+    '''
+    Returns the set of the normalized titles of the categories in the graph of the crawler,
+    to check in constant time whether a page category belongs to the graph.
+    '''
+    category_index = set()
+    for node, node_data in category_crawler.get_category_graph().nodes(data=True):
+        node_title = node_data.get('attr_dict', {}).get('title', node)
+        if node_title.startswith('Category:'): #get those nodes that are categories
+            category_index.add(normalize_category_title(node_title))
+    return frozenset(category_index)
+
 
 
 '''
@@ -69,17 +117,16 @@ def identify_page_category_map(category_crawler_source, category_crawler_dest):
     pages_categories_map = {}
     pages_url_map = {}
 
-    nodes_dest = nx.DiGraph(category_crawler_dest.get_category_graph()).nodes
-    nodes_source = nx.DiGraph(category_crawler_source.get_category_graph()).nodes
+    nodes_source = category_crawler_source.get_category_graph().nodes
 
-    nodes_dest_category_only = [n for n in nodes_dest if n.startswith('Category:')] #get those nodes that are categories
+    category_index_dest = get_category_index(category_crawler_dest)
 
     for node_source in nodes_source:
 
         if node_source != 'root_node':
 
             try:
-                reference_page = get_page_from_node(node_source)
+                reference_page = get_page_from_node(node_source, category_crawler_source.backend)
 
                 page_url = reference_page.url
                 page_title = reference_page.title
@@ -88,8 +135,8 @@ def identify_page_category_map(category_crawler_source, category_crawler_dest):
                     ref_page_cats_source = reference_page.categories #get categories from page
 
                     for ref_page_cat in ref_page_cats_source: #check if any of the categories of the page belong to the categories of the other portal
-                        if ('Category:' + ref_page_cat) in nodes_dest_category_only:
-                            print("page %s has category %s in common with the other portal" % (page_title, ref_page_cat))
+                        if normalize_category_title(ref_page_cat) in category_index_dest:
+                            logger.info("page %s has category %s in common with the other portal", page_title, ref_page_cat, extra={'page': page_title, 'category': ref_page_cat})
 
                             if page_title not in pages_categories_map.keys():
                                 pages_categories_map[page_title] = []
@@ -97,8 +144,8 @@ def identify_page_category_map(category_crawler_source, category_crawler_dest):
                             pages_categories_map[page_title].append((node_source, ref_page_cat))
 
                             pages_url_map[page_title] = page_url
-            except (PageError, DisambiguationError):
-                print("Page for %s not found or ambiguous" % node_source)
+            except PageNotFound: #the backends of the crawlers raise it for missing and ambiguous pages
+                logger.info("Page for %s not found or ambiguous", node_source)
 
     return pages_categories_map, pages_url_map
 
@@ -106,52 +153,63 @@ def identify_page_category_map(category_crawler_source, category_crawler_dest):
 This function identifies the links in a category graph, including pages, that point to pages that have a category
 in the other category graph. Basically, it computes the overlap between the graphs in terms of links. 
 The function is the same as identify_page_category_map, the only difference is that an additional recursion 
-is included to access the links in each page. 
+is included to access the links in each page. The links of each node are resolved in bulk (50 titles per request
+with the API) by the backend of the crawler, and each distinct link is resolved only once.
+
+Results are yielded as soon as they are found, as records (source node, link, page title, shared category, URL),
+one per category of the page that belongs to the other graph. Pages and links already seen are tracked by
+seen filters (see seen_filter.py) instead of maps of the results, so the memory does not grow with the results.
+
+@:param seen_pages: seen filter of the page titles already yielded, which can be shared between calls to
+yield each page once (e.g., for both directions of a comparison)
+@:param seen_links: seen filter of the links already resolved from the nodes of category_crawler_source
 '''
 
-def identify_link_category_map(category_crawler_source, category_crawler_dest):
-    pages_categories_map = {}
-    pages_url_map = {}
+def iter_link_overlap(category_crawler_source, category_crawler_dest, seen_pages=None, seen_links=None):
+    seen_pages = make_seen_filter() if seen_pages is None else seen_pages
+    seen_links = make_seen_filter() if seen_links is None else seen_links
 
-    nodes_dest = nx.DiGraph(category_crawler_dest.get_category_graph()).nodes
-    nodes_source = nx.DiGraph(category_crawler_source.get_category_graph()).nodes
+    nodes_source = category_crawler_source.get_category_graph().nodes
 
-    nodes_dest_category_only = [n for n in nodes_dest if
-                                n.startswith('Category:')]  # get those nodes that are categories
+    category_index_dest = get_category_index(category_crawler_dest)
 
     for node_source in nodes_source:
 
         if node_source != 'root_node':
 
-            page_links = get_links_from_page(node_source)
-
-            for link_page_name in page_links:
-                print(link_page_name)
-
-                try:
-
-                    reference_page = get_page_from_node(link_page_name)
+            page_links = get_links_from_page(node_source, category_crawler_source.backend)
 
-                    page_url = reference_page.url
-                    page_title = reference_page.title
+            new_links = [link_page_name for link_page_name in dict.fromkeys(page_links) if seen_links.add(link_page_name)]
+            # title, URL and categories of the new links, resolved in bulk: link -> (title, URL, categories)
+            linked_pages = category_crawler_source.backend.search_pages_by_titles(new_links)
 
-                    if page_title not in pages_categories_map.keys(): #If I didn't visit this link already
+            for link_page_name in new_links:
+                logger.debug("%s", link_page_name)
 
-                        ref_page_cats_source = reference_page.categories  # get categories from page
+                if link_page_name not in linked_pages:
+                    logger.info("Page for %s not found or ambiguous", link_page_name)
+                    continue
 
-                        for ref_page_cat in ref_page_cats_source:  # check if any of the categories of the page belong to the categories of the other portal
-                            if ('Category:' + ref_page_cat) in nodes_dest_category_only:
-                                print("page %s has category %s in common with the other portal" % (page_title, ref_page_cat))
+                page_title, page_url, ref_page_cats_source = linked_pages[link_page_name]
 
-                                if page_title not in pages_categories_map.keys(): #This is true only the first time I check
-                                    pages_categories_map[page_title] = []
+                common_cats = [ref_page_cat for ref_page_cat in ref_page_cats_source # check if any of the categories of the page belong to the categories of the other portal
+                               if normalize_category_title(ref_page_cat) in category_index_dest]
 
-                                pages_categories_map[page_title].append((link_page_name, ref_page_cat))
+                if common_cats and seen_pages.add(page_title): #If I didn't yield this page already
+                    for ref_page_cat in common_cats:
+                        logger.info("page %s has category %s in common with the other portal", page_title, ref_page_cat, extra={'page': page_title, 'category': ref_page_cat})
+                        yield node_source, link_page_name, page_title, ref_page_cat, page_url
 
-                                pages_url_map[page_title] = page_url
+def identify_link_category_map(category_crawler_source, category_crawler_dest):
+    '''
+    Collects the records of iter_link_overlap in the maps returned by identify_page_category_map.
+    '''
+    pages_categories_map = {}
+    pages_url_map = {}
 
-                except (PageError, DisambiguationError):
-                    print("Page for %s not found or ambiguous" % link_page_name)
+    for _, link_page_name, page_title, ref_page_cat, page_url in iter_link_overlap(category_crawler_source, category_crawler_dest):
+        pages_categories_map.setdefault(page_title, []).append((link_page_name, ref_page_cat))
+        pages_url_map[page_title] = page_url
 
     return pages_categories_map, pages_url_map
 
@@ -165,6 +223,223 @@ def get_common_linked_pages(category_crawl_A, category_crawl_B):
 
     return common_pages, common_urls
 
+def iter_common_linked_pages(category_crawl_A, category_crawl_B, seen_filter_factory=make_seen_filter):
+    '''
+    Streaming version of get_common_linked_pages: yields the records of iter_link_overlap for both
+    directions, each page once.
+    :param seen_filter_factory: function returning a new seen filter, e.g. a BloomFilter for fixed memory
+    '''
+    seen_pages = seen_filter_factory()
+    for source, dest in ((category_crawl_A, category_crawl_B), (category_crawl_B, category_crawl_A)):
+        for record in iter_link_overlap(source, dest, seen_pages, seen_filter_factory()):
+            yield record
+
+def write_overlap_records(records, out_path):
+    '''
+    Writes the records of iter_link_overlap as they are produced, as CSV or, if the file name ends
+    with .jsonl, as JSON lines. Each record is flushed, so that an interrupted run keeps the records found.
+    :return: number of records written
+    '''
+    written = 0
+    with open(out_path, 'w', newline='', encoding='utf-8') as out_file:
+        if out_path.endswith('.jsonl'):
+            write_record = lambda record: out_file.write(json.dumps(dict(zip(OVERLAP_FIELDS, record)), ensure_ascii=False) + '\n')
+        else:
+            writer = csv.writer(out_file)
+            writer.writerow(OVERLAP_FIELDS)
+            write_record = writer.writerow
+        for record in records:
+            write_record(record)
+            out_file.flush()
+            written += 1
+    return written
+
+def _title_words(title):
+    return [word for word in re.findall(r'\w+', title.lower()) if word not in STOPWORDS and not word.isdigit()]
+
+def _node_depths(category_graph, max_depth=None):
+    '''
+    Returns the nodes of the graph reachable from the root node, with their depth (1 for the portal),
+    ordered by depth, up to max_depth.
+    '''
+    successors = {}
+    for source, target in category_graph.edges():
+        successors.setdefault(source, []).append(target)
+
+    node_depths = {'root_node': 0}
+    level = ['root_node']
+    while level and (max_depth is None or node_depths[level[0]] < max_depth):
+        next_level = []
+        for node in level:
+            for successor in successors.get(node, ()):
+                if successor not in node_depths:
+                    node_depths[successor] = node_depths[node] + 1
+                    next_level.append(successor)
+        level = next_level
+    del node_depths['root_node']
+    return sorted(node_depths.items(), key=lambda node_depth: node_depth[1])
+
+'''
+Prioritized version of iter_link_overlap, for portals too large to check every link. The links of the
+nodes of category_crawler_source (shallowest nodes first, optionally up to max_depth) enter a frontier,
+where they are scored with no API call:
+- by the share of their words that appear in the titles of the categories of category_crawler_dest;
+- by the number of source pages linking them;
+- by the hit rate of their words among the links already resolved, updated as the search goes on;
+- years, dates and lists (GENERIC_LINK) are scored GENERIC_LINK_SCORE, and resolved last.
+The search alternates between fetching the links of the next nodes and resolving the best links of the
+frontier, MAX_IDS_PER_QUERY per bulk query, until the budget is spent or the frontier is empty.
+The requests are counted on crawl_stats.stats, continuations included, and the budget is also checked
+between the continuations of a bulk query: the pages of an interrupted query may miss some links or
+categories. A backend that sends no request (e.g. dump_backend.DumpBackend) spends no budget.
+
+@:param max_requests: maximum number of API requests sent (the ones answered by the cache are free), None for no limit
+@:param time_limit: maximum seconds of search, None for no limit
+@:param top_k: number of pages returned, the ones with most categories in common with the other graph and
+most linked from the source graph, None for all the pages found
+@:param min_score: links scored below min_score are never resolved, None to resolve all of them
+@:param max_depth: maximum depth of the source nodes whose links are checked, None for all of them
+@:param seen_pages: seen filter of the page titles already found, as in iter_link_overlap
+
+@:return list of records (source node, link, page title, shared category, URL) as iter_link_overlap, grouped by
+page from the best one, and dictionary with the statistics of the search
+'''
+
+def search_link_overlap(category_crawler_source, category_crawler_dest, max_requests=None, time_limit=None, top_k=None,
+                        min_score=None, max_depth=None, seen_pages=None):
+    backend = category_crawler_source.backend
+    seen_pages = make_seen_filter() if seen_pages is None else seen_pages
+    start_time = time.time()
+
+    category_index_dest = get_category_index(category_crawler_dest)
+    dest_words = set(word for category_title in category_index_dest for word in _title_words(category_title))
+
+    nodes = [node for node, _ in _node_depths(category_crawler_source.get_category_graph(), max_depth)]
+    next_node = 0
+
+    # link -> [source pages linking it, first source node], for the links not resolved yet
+    candidates = {}
+    resolved_links = make_seen_filter()
+    frontier = []
+    # word -> [resolved links with the word, links found in common among them]
+    word_hits = {}
+    pages = [] #heap of (number of shared categories, links from the source, order, records) of the pages found
+    report = {'requests': 0, 'nodes': 0, 'links': 0, 'resolved': 0, 'pages': 0, 'budget_spent': False}
+    start_requests = stats.sent_requests()
+
+    def score(link, link_count):
+        if GENERIC_LINK.match(link):
+            return GENERIC_LINK_SCORE
+        words = _title_words(link)
+        if not words:
+            return 0.0
+        link_score = sum(1 for word in words if word in dest_words) / len(words) + LINK_COUNT_WEIGHT * math.log(link_count)
+        hit_rates = [word_hits[word][1] / word_hits[word][0] for word in words if word in word_hits]
+        if hit_rates:
+            link_score += HIT_RATE_WEIGHT * sum(hit_rates) / len(hit_rates)
+        return link_score
+
+    def within_budget():
+        report['requests'] = stats.sent_requests() - start_requests
+        if max_requests is not None and report['requests'] >= max_requests:
+            return False
+        return time_limit is None or time.time() - start_time < time_limit
+
+    def budget_spent():
+        return not within_budget()
+
+    expand_turn = True
+    while within_budget():
+
+        if next_node < len(nodes) and (expand_turn or len(frontier) < MAX_IDS_PER_QUERY):
+            expand_turn = False
+            batch = nodes[next_node:next_node + MAX_IDS_PER_QUERY]
+            next_node += len(batch)
+            titles = dict((node[len('Category:'):] if node.startswith('Category:') else node, node) for node in batch)
+            report['nodes'] += len(batch)
+            for title, page_links in backend.search_links_by_titles(list(titles), budget_spent).items():
+                for link in dict.fromkeys(page_links):
+                    if link in resolved_links:
+                        continue
+                    candidate = candidates.get(link)
+                    if candidate is None:
+                        candidate = candidates[link] = [0, titles[title]]
+                        report['links'] += 1
+                    candidate[0] += 1
+                    # pushed again when linked by another node, with the new score: the old entry becomes stale
+                    heapq.heappush(frontier, (-score(link, candidate[0]), report['links'], link))
+            continue
+
+        batch = []
+        while frontier and len(batch) < MAX_IDS_PER_QUERY:
+            link_score, _, link = heapq.heappop(frontier)
+            if link not in candidates or link in batch:
+                continue
+            if min_score is not None and -link_score < min_score:
+                frontier = []
+                break
+            batch.append(link)
+        if not batch:
+            if next_node < len(nodes):
+                continue
+            break
+
+        expand_turn = True
+        report['resolved'] += len(batch)
+        linked_pages = backend.search_pages_by_titles(batch, budget_spent)
+
+        for link in batch:
+            link_count, node_source = candidates.pop(link)
+            resolved_links.add(link)
+            found = False
+
+            if link in linked_pages:
+                page_title, page_url, ref_page_cats_source = linked_pages[link]
+                common_cats = [ref_page_cat for ref_page_cat in ref_page_cats_source if normalize_category_title(ref_page_cat) in category_index_dest]
+                found = bool(common_cats)
+
+                if common_cats and seen_pages.add(page_title):
+                    logger.info("page %s has category %s in common with the other portal", page_title, common_cats[0], extra={'page': page_title, 'category': common_cats[0]})
+                    report['pages'] += 1
+                    page = (len(common_cats), link_count, -report['pages'],
+                            [(node_source, link, page_title, ref_page_cat, page_url) for ref_page_cat in common_cats])
+                    if top_k is None or len(pages) < top_k:
+                        heapq.heappush(pages, page)
+                    elif page[:3] > pages[0][:3]:
+                        heapq.heapreplace(pages, page)
+
+            for word in set(_title_words(link)):
+                hits = word_hits.setdefault(word, [0, 0])
+                hits[0] += 1
+                hits[1] += found
+    else:
+        report['budget_spent'] = True
+
+    report['requests'] = stats.sent_requests() - start_requests
+    report['seconds'] = time.time() - start_time
+    logger.info("Prioritized search: %d API requests, %d of %d links resolved, %d pages found", report['requests'],
+                report['resolved'], report['links'], report['pages'], extra=report)
+
+    records = [record for page in sorted(pages, key=lambda page: page[:3], reverse=True) for record in page[3]]
+    return records, report
+
+def get_prioritized_common_linked_pages(category_crawl_A, category_crawl_B, max_requests=None, time_limit=None, top_k=None,
+                                        min_score=None, max_depth=None, seen_filter_factory=make_seen_filter):
+    '''
+    Budgeted version of iter_common_linked_pages: runs search_link_overlap in both directions, each with
+    half of the budget, and returns the records of the top_k pages of each direction, each page once.
+    :return: list of records, and list with the statistics of the two searches
+    '''
+    seen_pages = seen_filter_factory()
+    records = []
+    reports = []
+    for source, dest in ((category_crawl_A, category_crawl_B), (category_crawl_B, category_crawl_A)):
+        direction_records, report = search_link_overlap(source, dest, None if max_requests is None else max(1, max_requests // 2),
+                                                        None if time_limit is None else time_limit / 2, top_k, min_score, max_depth, seen_pages)
+        records.extend(direction_records)
+        reports.append(report)
+    return records, reports
+
 def get_common_pages(category_crawl_A, category_crawl_B):
 
     cat_map_A, url_map_A = identify_page_category_map(category_crawl_A, category_crawl_B)
@@ -180,14 +455,93 @@ Possible intersections are:
 - (-m) Common categories for main pages: main pages from any of the category graphs that have a category in common with the other graph
 - (-p) Common pages: pages form any of the category graphs that have a category in commmon with the other graph
 - (-l) Common links: links included in the pages of any category graph and having a category in common with the other graph
+With more than two portals, or with --index, the intersections of every pair of portals are computed
+from a portal_index.PortalIndex, and printed as an overlap matrix.
 '''
 
-def main():
-    portal_A = sys.argv[1:][0]
-    portal_B = sys.argv[1:][1]
-    subcategory_depth = int(sys.argv[1:][2])
-    mode = sys.argv[1:][3]
+def print_overlap_matrix(portals, matrix, out_file=None):
+    '''
+    Prints the overlap matrix as tab separated values, with the portals as row and column headers.
+    '''
+    lines = ['\t'.join([''] + portals)]
+    for portal, row in zip(portals, matrix):
+        lines.append('\t'.join([portal] + [str(value) for value in row]))
 
+    if out_file is None:
+        print('\n'.join(lines))
+    else:
+        with open(out_file, 'w', encoding='utf-8') as matrix_file:
+            matrix_file.write('\n'.join(lines) + '\n')
+        print('Overlap matrix saved in ' + out_file)
+
+def compare_portals(portals, subcategory_depth, mode, index_path=None, refresh=False, out_file=None, backend=None):
+    '''
+    Computes the overlap matrix of the given portals from the index, crawling only the portals
+    that are not indexed yet (or all of them, with refresh=True).
+    '''
+    from portal_index import PortalIndex, MODE_PAGE_SETS
+
+    page_set = MODE_PAGE_SETS[mode]
+    index = PortalIndex(index_path, backend)
+
+    for portal in portals:
+        if refresh or not index.has_portal(portal, subcategory_depth, page_set):
+            index.add_portal(portal, subcategory_depth, page_set)
+            if index_path is not None:
+                index.save() #saved after each portal, so that an interrupted run keeps the crawled ones
+
+    portal_keys = [(portal, subcategory_depth) for portal in portals]
+
+    print('These are the numbers of categories in common between the portals')
+    print_overlap_matrix(portals, index.category_overlap_matrix(portal_keys))
+
+    print('These are the numbers of %s from any of the two portals that have a category in common with the other portal' %
+          {'main': 'main pages', 'pages': 'pages', 'links': 'links'}[page_set])
+    print_overlap_matrix(portals, index.overlap_matrix(portal_keys, page_set), out_file)
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Compute the overlap between the category graphs of two or more Wikipedia portals.')
+    parser.add_argument('portals', nargs='+', help='categories to compare, e.g. "Category:Emerging technologies" "Category:Artificial intelligence"')
+    parser.add_argument('subcategory_depth', type=int, help='depth to explore in the tree of subcategories')
+    mode_group = parser.add_mutually_exclusive_group(required=True)
+    mode_group.add_argument('-m', dest='mode', action='store_const', const='-m', help='common categories for main pages')
+    mode_group.add_argument('-p', dest='mode', action='store_const', const='-p', help='common pages')
+    mode_group.add_argument('-l', dest='mode', action='store_const', const='-l', help='common links')
+    parser.add_argument('--index', default=None, help='portal index file (.npz): indexed portals are not crawled again')
+    parser.add_argument('--refresh', action='store_true', help='crawl the portals again even if they are in the index')
+    parser.add_argument('--out', default=None, help='file where the overlap matrix is saved as tab separated values')
+    parser.add_argument('--stream', default=None, help='with -l and two portals, CSV (or .jsonl) file where the common links are written as they are found')
+    seen_filter.add_seen_filter_arguments(parser)
+    budget_group = parser.add_argument_group('prioritized search', 'with -l and two portals, resolve the most promising links first, within a budget')
+    budget_group.add_argument('--max-requests', type=int, default=None, help='maximum number of API requests sent by the search')
+    budget_group.add_argument('--time-limit', type=float, default=None, help='maximum seconds of the search')
+    budget_group.add_argument('--top-k', type=int, default=None, help='number of pages returned for each portal, the most relevant ones')
+    budget_group.add_argument('--min-score', type=float, default=None, help='links scored below this value are never resolved')
+    budget_group.add_argument('--max-link-depth', type=int, default=None, help='maximum depth of the nodes whose links are checked')
+    wiki_cache.add_cache_arguments(parser)
+    wiki_backend.add_backend_arguments(parser)
+    crawl_stats.add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if len(args.portals) < 2:
+        parser.error('at least two portals are required')
+    prioritized = any(option is not None for option in (args.max_requests, args.time_limit, args.top_k, args.min_score, args.max_link_depth))
+    if (args.stream is not None or prioritized) and (args.mode != '-l' or len(args.portals) > 2 or args.index is not None):
+        parser.error('--stream and the options of the prioritized search require -l and two portals, without --index')
+
+    subcategory_depth = args.subcategory_depth
+    mode = args.mode
+
+    wiki_client.configure(cache=wiki_cache.cache_from_args(args))
+    crawl_stats.setup_from_args(args)
+    backend = wiki_backend.backend_from_args(args)
+
+    if len(args.portals) > 2 or args.index is not None:
+        compare_portals(args.portals, subcategory_depth, mode, index_path=args.index, refresh=args.refresh, out_file=args.out, backend=backend)
+        crawl_stats.write_from_args(args)
+        return
+
+    portal_A, portal_B = args.portals
 
     if mode == '-m': #m: get common main pages
         m_include_pages = False
@@ -201,15 +555,32 @@ def main():
     else:
         return -1
 
-    d_A = CategoryCrawler(portal_A)
+    d_A = CategoryCrawler(portal_A, backend=backend)
     d_A.search_and_store_graph(portal_A, cat_page_id='unknown', subcategory_depth=subcategory_depth, max_depth=10,
                                parent_node="root_node", include_pages=m_include_pages, node_type='name')
 
-    d_B = CategoryCrawler(portal_B)
+    d_B = CategoryCrawler(portal_B, backend=backend)
     d_B.search_and_store_graph(portal_B, cat_page_id='unknown', subcategory_depth=subcategory_depth, max_depth=10,
                                parent_node="root_node", include_pages=m_include_pages, node_type='name')
 
 
+    if prioritized:
+        records, _ = get_prioritized_common_linked_pages(d_A, d_B, args.max_requests, args.time_limit, args.top_k, args.min_score,
+                                                         args.max_link_depth, lambda: seen_filter.seen_filter_from_args(args))
+    elif args.stream is not None:
+        records = iter_common_linked_pages(d_A, d_B, lambda: seen_filter.seen_filter_from_args(args))
+
+    if args.stream is not None:
+        print('%d common links written in %s' % (write_overlap_records(records, args.stream), args.stream))
+        crawl_stats.write_from_args(args)
+        return
+    if prioritized:
+        print(out_message)
+        for _, _, page_title, category, url in records:
+            print('%s\t%s\t%s' % (page_title, category, url))
+        crawl_stats.write_from_args(args)
+        return
+
     if mode == '-m' or mode == '-p':
         common_pages, common_url = get_common_pages(d_A, d_B)
     elif mode == '-l':
@@ -224,8 +595,16 @@ def main():
     for item in common_pages:
         print(str(item))
 
+    crawl_stats.write_from_args(args)
+
 
 #Call this module as, e.g.: python common_link_crawler.py "Category:Emerging technologies" "Category:Artificial intelligence" 1 -m
+#or, to compare several portals and keep them indexed for the next queries:
+#python common_link_crawler.py "Category:Emerging technologies" "Category:Artificial intelligence" "Category:Robotics" 1 -p --index portals.npz
+#or, to write the common links as they are found, with a fixed-memory deduplication:
+#python common_link_crawler.py "Category:Emerging technologies" "Category:Artificial intelligence" 1 -l --stream links.jsonl --seen-filter bloom
+#or, to get the 20 best common links of each portal within 200 queries:
+#python common_link_crawler.py "Category:Emerging technologies" "Category:Artificial intelligence" 2 -l --top-k 20 --max-requests 200
 
 if __name__ == "__main__":
     main()
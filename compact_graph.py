@@ -0,0 +1,350 @@
+'''
+Created on Oct 2026
+
+Compact store for large category graphs, used by CategoryCrawler with graph_backend='compact'
+in place of a networkx DiGraph. Nodes are rows of integer arrays (page ID, title and URL as
+indexes in an interned string table), edges are two arrays of node rows, and node categories
+are stored as a flat array of string indexes with per-node offsets. The graph can be exported
+by streaming it to GEXF or GraphML, or saved in a binary format that loads back with a few
+array reads.
+'''
+import ast
+import struct
+from array import array
+
+NO_VALUE = -1 #missing page ID, title or URL
+BINARY_MAGIC = b'DESIRAG1'
+GRAPH_FORMATS = ('gexf', 'graphml', 'bin')
+EDGE_KEY_BASE = 1 << 32 #edges are deduplicated through a single integer per edge
+
+
+class StringTable(object):
+    '''
+    Interned strings: each distinct string is stored once and referred to by its index.
+    '''
+
+    def __init__(self):
+        self.strings = []
+        self._index = {}
+
+    def intern(self, string):
+        index = self._index.get(string)
+        if index is None:
+            index = len(self.strings)
+            self._index[string] = index
+            self.strings.append(string)
+        return index
+
+    def lookup(self, string):
+        return self._index.get(string, NO_VALUE)
+
+    def __getitem__(self, index):
+        return self.strings[index] if index != NO_VALUE else None
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class _NodeView(object):
+    '''
+    Read-only view of the nodes, with the subset of the networkx NodeView interface used by the
+    scripts: iteration over the node keys, membership, and nodes(data=True).
+    '''
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __iter__(self):
+        strings = self._graph.strings
+        return (strings[key] for key in self._graph.node_key)
+
+    def __len__(self):
+        return len(self._graph.node_key)
+
+    def __contains__(self, node):
+        return self._graph.has_node(node)
+
+    def __call__(self, data=False):
+        if not data:
+            return iter(self)
+        return ((self._graph.strings[self._graph.node_key[row]], self._graph.node_data(row)) for row in range(len(self)))
+
+
+class CompactGraph(object):
+
+    def __init__(self):
+        self.strings = StringTable()
+        self._rows = {} #string index of the node key -> node row
+
+        # one element per node
+        self.node_key = array('q')
+        self.node_page_id = array('q')
+        self.node_title = array('q')
+        self.node_url = array('q')
+        self.node_categories_end = array('q') #categories of node i are categories[end[i-1]:end[i]]
+
+        self.categories = array('q')
+
+        # one element per edge
+        self.edge_source = array('q')
+        self.edge_target = array('q')
+        self._edges = set() #source row * EDGE_KEY_BASE + target row, to skip duplicated edges as a DiGraph does
+
+    # ======== networkx-like interface used by CategoryCrawler ========
+
+    @property
+    def nodes(self):
+        return _NodeView(self)
+
+    def has_node(self, node):
+        return self.strings.lookup(node) in self._rows
+
+    def __contains__(self, node):
+        return self.has_node(node)
+
+    def __len__(self):
+        return len(self.node_key)
+
+    def number_of_nodes(self):
+        return len(self.node_key)
+
+    def number_of_edges(self):
+        return len(self.edge_source)
+
+    def _get_row(self, node):
+        key = self.strings.intern(node)
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self.node_key)
+            self._rows[key] = row
+            self.node_key.append(key)
+            self.node_page_id.append(NO_VALUE)
+            self.node_title.append(NO_VALUE)
+            self.node_url.append(NO_VALUE)
+            self.node_categories_end.append(len(self.categories))
+        return row
+
+    def add_node(self, node, attr_dict=None):
+        '''
+        Adds a node, or updates its attributes. The attributes are those stored by CategoryCrawler:
+        url, title, id (the page ID, or 'unknown') and categories. Categories are stored contiguously,
+        so they can be set only while the node is the last one added (as the crawler does).
+        '''
+        row = self._get_row(node)
+        if not attr_dict:
+            return
+
+        if isinstance(attr_dict.get('id'), int):
+            self.node_page_id[row] = attr_dict['id']
+        if attr_dict.get('title') is not None:
+            self.node_title[row] = self.strings.intern(attr_dict['title'])
+        if attr_dict.get('url') is not None:
+            self.node_url[row] = self.strings.intern(attr_dict['url'])
+
+        if attr_dict.get('categories') and row == len(self.node_key) - 1 and self.node_categories_end[row] == len(self.categories):
+            self.categories.extend(self.strings.intern(category) for category in attr_dict['categories'])
+            self.node_categories_end[row] = len(self.categories)
+
+    def add_edge(self, source, target):
+        source_row = self._get_row(source)
+        target_row = self._get_row(target)
+        edge = source_row * EDGE_KEY_BASE + target_row
+        if edge not in self._edges:
+            self._edges.add(edge)
+            self.edge_source.append(source_row)
+            self.edge_target.append(target_row)
+
+    def edges(self):
+        strings = self.strings
+        node_key = self.node_key
+        return ((strings[node_key[source]], strings[node_key[target]]) for source, target in zip(self.edge_source, self.edge_target))
+
+    def node_data(self, row):
+        '''
+        Attributes of the node in the given row, in the same form CategoryCrawler stores them in a DiGraph.
+        '''
+        if self.node_title[row] == NO_VALUE and self.node_url[row] == NO_VALUE and self.node_page_id[row] == NO_VALUE:
+            return {}
+        start = self.node_categories_end[row - 1] if row > 0 else 0
+        attributes = {'url': self.strings[self.node_url[row]], 'title': self.strings[self.node_title[row]],
+                      'id': self.node_page_id[row] if self.node_page_id[row] != NO_VALUE else 'unknown'}
+        if self.node_categories_end[row] > start:
+            attributes['categories'] = [self.strings[category] for category in self.categories[start:self.node_categories_end[row]]]
+        return {'attr_dict': attributes}
+
+    # ======== conversions ========
+
+    @classmethod
+    def from_networkx(cls, graph):
+        compact_graph = cls()
+        for node, node_data in graph.nodes(data=True):
+            compact_graph.add_node(node, node_data.get('attr_dict'))
+        for source, target in graph.edges():
+            compact_graph.add_edge(source, target)
+        return compact_graph
+
+    def to_networkx(self):
+        import networkx as nx
+        graph = nx.DiGraph()
+        for node, node_data in self.nodes(data=True):
+            graph.add_node(node, **node_data)
+        graph.add_edges_from(self.edges())
+        return graph
+
+    # ======== streaming export ========
+
+    def _iter_node_rows(self):
+        strings = self.strings
+        for row in range(len(self.node_key)):
+            page_ID = self.node_page_id[row]
+            yield (row, strings[self.node_key[row]], strings[self.node_title[row]] or '', strings[self.node_url[row]] or '',
+                   page_ID if page_ID != NO_VALUE else '')
+
+    def write_gexf(self, path):
+        '''
+        Streams the graph to a GEXF file (e.g., for Gephi), with url, title and page ID as node attributes.
+        '''
+        from xml.sax.saxutils import quoteattr #imports urllib, only needed to export
+        with open(path, 'w', encoding='utf-8') as gexf_file:
+            gexf_file.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                            '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                            '  <graph defaultedgetype="directed" mode="static">\n'
+                            '    <attributes class="node" mode="static">\n'
+                            '      <attribute id="0" title="url" type="string" />\n'
+                            '      <attribute id="1" title="title" type="string" />\n'
+                            '      <attribute id="2" title="pageid" type="string" />\n'
+                            '    </attributes>\n'
+                            '    <nodes>\n')
+            for row, key, title, url, page_ID in self._iter_node_rows():
+                gexf_file.write('      <node id="n%d" label=%s>\n        <attvalues>\n'
+                                '          <attvalue for="0" value=%s />\n'
+                                '          <attvalue for="1" value=%s />\n'
+                                '          <attvalue for="2" value="%s" />\n'
+                                '        </attvalues>\n      </node>\n' % (row, quoteattr(key), quoteattr(url), quoteattr(title), page_ID))
+            gexf_file.write('    </nodes>\n    <edges>\n')
+            for edge, (source, target) in enumerate(zip(self.edge_source, self.edge_target)):
+                gexf_file.write('      <edge id="%d" source="n%d" target="n%d" />\n' % (edge, source, target))
+            gexf_file.write('    </edges>\n  </graph>\n</gexf>\n')
+
+    def write_graphml(self, path):
+        '''
+        Streams the graph to a GraphML file, with label, url, title and page ID as node attributes.
+        '''
+        from xml.sax.saxutils import escape #imports urllib, only needed to export
+        with open(path, 'w', encoding='utf-8') as graphml_file:
+            graphml_file.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                               '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                               '  <key id="label" for="node" attr.name="label" attr.type="string" />\n'
+                               '  <key id="url" for="node" attr.name="url" attr.type="string" />\n'
+                               '  <key id="title" for="node" attr.name="title" attr.type="string" />\n'
+                               '  <key id="pageid" for="node" attr.name="pageid" attr.type="string" />\n'
+                               '  <graph edgedefault="directed">\n')
+            for row, key, title, url, page_ID in self._iter_node_rows():
+                graphml_file.write('    <node id="n%d">\n'
+                                   '      <data key="label">%s</data>\n'
+                                   '      <data key="url">%s</data>\n'
+                                   '      <data key="title">%s</data>\n'
+                                   '      <data key="pageid">%s</data>\n'
+                                   '    </node>\n' % (row, escape(key), escape(url), escape(title), page_ID))
+            for source, target in zip(self.edge_source, self.edge_target):
+                graphml_file.write('    <edge source="n%d" target="n%d" />\n' % (source, target))
+            graphml_file.write('  </graph>\n</graphml>\n')
+
+    # ======== binary format ========
+
+    def _arrays(self):
+        return (self.node_key, self.node_page_id, self.node_title, self.node_url, self.node_categories_end,
+                self.categories, self.edge_source, self.edge_target)
+
+    def save(self, path):
+        '''
+        Saves the graph in a binary file: a header with the array lengths, the arrays, and the
+        string table as UTF-8 bytes with their end offsets.
+        '''
+        encoded_strings = [string.encode('utf-8') for string in self.strings.strings]
+        string_ends = array('q')
+        end = 0
+        for encoded_string in encoded_strings:
+            end += len(encoded_string)
+            string_ends.append(end)
+
+        arrays = self._arrays() + (string_ends,)
+        with open(path, 'wb') as binary_file:
+            binary_file.write(BINARY_MAGIC)
+            binary_file.write(struct.pack('<%dq' % len(arrays), *[len(values) for values in arrays]))
+            for values in arrays:
+                values.tofile(binary_file)
+            binary_file.write(b''.join(encoded_strings))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Loads a graph saved with save.
+        '''
+        graph = cls()
+        arrays = graph._arrays() + (array('q'),)
+        with open(path, 'rb') as binary_file:
+            if binary_file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError('%s is not a compact graph file' % path)
+            lengths = struct.unpack('<%dq' % len(arrays), binary_file.read(8 * len(arrays)))
+            for values, length in zip(arrays, lengths):
+                values.fromfile(binary_file, length)
+            strings_blob = binary_file.read()
+
+        string_ends = arrays[-1]
+        start = 0
+        for end in string_ends:
+            graph.strings.intern(strings_blob[start:end].decode('utf-8'))
+            start = end
+
+        graph._rows = dict((key, row) for row, key in enumerate(graph.node_key))
+        graph._edges = set(source * EDGE_KEY_BASE + target for source, target in zip(graph.edge_source, graph.edge_target))
+        return graph
+
+
+def export_graph(graph, path, graph_format='gexf'):
+    '''
+    Saves a category graph, either a networkx DiGraph or a CompactGraph, in one of GRAPH_FORMATS.
+    DiGraphs are written to GEXF by networkx as before, and converted to a CompactGraph for the other formats.
+    '''
+    if not isinstance(graph, CompactGraph):
+        if graph_format == 'gexf':
+            import networkx as nx
+            nx.write_gexf(graph, path)
+            return
+        graph = CompactGraph.from_networkx(graph)
+
+    if graph_format == 'gexf':
+        graph.write_gexf(path)
+    elif graph_format == 'graphml':
+        graph.write_graphml(path)
+    elif graph_format == 'bin':
+        graph.save(path)
+    else:
+        raise ValueError('unknown graph format %s' % graph_format)
+
+
+def load_graph(path):
+    '''
+    Loads a category graph saved by export_graph: the binary format as a CompactGraph, GEXF and GraphML as a networkx DiGraph.
+    '''
+    if path.endswith('.bin'):
+        return CompactGraph.load(path)
+    import networkx as nx
+    return nx.read_graphml(path) if path.endswith('.graphml') else nx.read_gexf(path)
+
+
+def node_attributes(node_data):
+    '''
+    Returns the attributes stored by CategoryCrawler in a node (url, title, id, categories), whichever
+    way the graph was stored: in memory they are in attr_dict, in a gexf file written by networkx
+    attr_dict is a string, and in the files streamed by CompactGraph they are separate node attributes.
+    '''
+    if 'attr_dict' in node_data:
+        attributes = node_data['attr_dict']
+        return ast.literal_eval(attributes) if isinstance(attributes, str) else attributes
+    if 'title' in node_data or 'url' in node_data:
+        page_ID = node_data.get('pageid', '')
+        return {'url': node_data.get('url'), 'title': node_data.get('title'),
+                'id': int(page_ID) if str(page_ID).isdigit() else 'unknown'}
+    return {}
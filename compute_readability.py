@@ -1,22 +1,41 @@
-import wikipedia
-import textstat
-import requests
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+import wiki_client
 
 API_URL = 'http://en.wikipedia.org/w/api.php'
+DEFAULT_PROCESSES = os.cpu_count() or 1 #processes used to score a corpus
+SCORING_CHUNK = 1000 #documents handed to the process pool at a time, to keep memory bounded on large corpora
+EASY_WORDS_FILES = ('easy_words.txt', os.path.join('resources', 'en', 'easy_words.txt')) #location of the Dale-Chall list in the textstat package
+SENTENCE_SPLIT = re.compile(r' *[\.\?!][\'"\)\]]*[ |\n](?=[A-Z])') #sentence boundaries, as in textstat
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+DIFFICULT_WORD = re.compile(r"[\w\='‘’]+") #tokens checked against the list of easy words, as in textstat
+LINSEAR_WRITE_WORDS = 100 #the Linsear Write formula is computed on the first 100 words
+METRICS = ('flesch_reading_ease', 'smog_index', 'flesch_kincaid_grade', 'coleman_liau_index', 'automated_readability_index',
+           'dale_chall_readability_score', 'difficult_words', 'linsear_write_formula', 'gunning_fog', 'text_standard')
+COUNT_FIELDS = ('sentences', 'words', 'syllables', 'characters', 'letters', 'polysyllables', 'difficult_words',
+                'difficult_polysyllables', 'linsear_easy', 'linsear_hard', 'linsear_sentences')
+CONSENSUS_METRICS = ('flesch_kincaid_grade', 'smog_index', 'coleman_liau_index', 'automated_readability_index',
+                     'dale_chall_readability_score', 'linsear_write_formula', 'gunning_fog')
+FLESCH_GRADES = ((90, 5), (80, 6), (70, 7), (60, 8), (50, 10), (40, 11), (30, 12)) #reading ease -> grade, in text_standard
+NO_GRADE = -1000 #placeholder for a missing grade in the consensus
+SMOG_MIN_SENTENCES = 3 #below this number of sentences the SMOG index is 0
+DALE_CHALL_DIFFICULT_PERCENTAGE = 5 #percentage of difficult words above which the Dale-Chall score is adjusted
 
 def _wiki_request_fun(params):
     '''
     Make a request to the Wikipedia API using the given search parameters.
     Returns a parsed dict of the JSON response.
+    The request goes through the pooled client in wiki_client, which retries on transient errors.
     '''
 
-    params['format'] = 'json'
-    if not 'action' in params:
-        params['action'] = 'query'
-
-    r = requests.get(API_URL, params=params)
-
-    return r.json()
+    return wiki_client.get_client(API_URL).request(params)
 
 def get_cat_info(category):
     title = category if category.startswith('Category:') else 'Category:' + category
@@ -32,6 +51,7 @@ def get_cat_info(category):
 
 
 def print_readability(text_to_analyse, option = 'short'):
+    import textstat
     if option == 'all':
         print("flesch (0-29: confusing, 30-59: Difficult, 60-69: Standard, 70-100: Easy): ", textstat.flesch_reading_ease(text_to_analyse))
         print("smog (years of education required): " , textstat.smog_index(text_to_analyse))
@@ -51,22 +71,336 @@ def print_readability(text_to_analyse, option = 'short'):
 def clean_wiki_content(in_wiki_page):
     return ("\n".join([l for l in in_wiki_page.splitlines() if (l and not l.startswith("="))]))
 
-page_name = "Artificial Intelligence"
+_easy_words = None
+
+def _get_easy_words():
+    '''
+    Returns the Dale-Chall list of easy words shipped with textstat, used to identify difficult words.
+    '''
+    global _easy_words
+    if _easy_words is None:
+        import textstat
+        _easy_words = set()
+        package_dir = os.path.dirname(textstat.__file__)
+        for easy_words_file in EASY_WORDS_FILES:
+            easy_words_path = os.path.join(package_dir, easy_words_file)
+            if os.path.isfile(easy_words_path):
+                with open(easy_words_path, encoding='utf-8') as words_file:
+                    _easy_words = set(line.strip().lower() for line in words_file if line.strip())
+                break
+    return _easy_words
+
+def _remove_punctuation(text):
+    return text.translate(PUNCTUATION_TABLE)
+
+def _count_sentences(text):
+    # as in textstat, sentences with at most two words are not counted
+    return max(1, len([sentence for sentence in SENTENCE_SPLIT.split(text) if len(_remove_punctuation(sentence).split()) > 2]))
+
+def compute_counts(text):
+    '''
+    Tokenizes a document once (sentences, words, syllables) and returns the counts that all the
+    readability formulas in print_readability are computed from. Syllables are computed once per
+    distinct word.
+    :return: dictionary with sentences, words, syllables, characters, letters, polysyllables,
+    difficult words (with at least 2 and at least 3 syllables) and the Linsear Write counts on the first 100 words
+    '''
+    import textstat
+    syllable_cache = {}
+
+    def syllable_count(word):
+        if word not in syllable_cache:
+            syllable_cache[word] = textstat.syllable_count(word)
+        return syllable_cache[word]
+
+    counts = dict.fromkeys(('words', 'syllables', 'polysyllables', 'linsear_easy', 'linsear_hard'), 0)
+    for word in _remove_punctuation(text).split():
+        syllables = syllable_count(word.lower())
+        counts['words'] += 1
+        counts['syllables'] += syllables
+        if syllables >= 3:
+            counts['polysyllables'] += 1
+
+    for word in text.split()[:LINSEAR_WRITE_WORDS]:
+        counts['linsear_hard' if syllable_count(_remove_punctuation(word.lower())) >= 3 else 'linsear_easy'] += 1
+
+    easy_words = _get_easy_words()
+    difficult_words = [word for word in set(DIFFICULT_WORD.findall(text.lower())) if word not in easy_words]
+    difficult_syllables = [syllable_count(_remove_punctuation(word)) for word in difficult_words]
+
+    counts['sentences'] = _count_sentences(text)
+    counts['characters'] = len(text.replace(' ', ''))
+    counts['letters'] = len(_remove_punctuation(text).replace(' ', ''))
+    counts['difficult_words'] = sum(1 for syllables in difficult_syllables if syllables >= 2)
+    counts['difficult_polysyllables'] = sum(1 for syllables in difficult_syllables if syllables >= 3)
+    counts['linsear_sentences'] = _count_sentences(' '.join(text.split()[:LINSEAR_WRITE_WORDS]))
+    return counts
+
+def _legacy_round(number, points=0):
+    # rounding used by textstat, half away from zero, applied element-wise
+    import numpy as np
+    p = 10 ** points
+    return np.floor(number * p + np.copysign(0.5, number)) / p
+
+def compute_metrics_array(counts):
+    '''
+    Vectorized readability engine: computes the metrics of print_readability for many documents
+    at once, with the formulas (and the roundings) of textstat, from the arrays of their counts.
+    :param counts: dictionary count name (see COUNT_FIELDS) -> array with one element per document
+    :return: dictionary metric name -> array with one score per document
+    '''
+    import numpy as np
+    counts = dict((field, np.asarray(counts[field], dtype=np.float64)) for field in COUNT_FIELDS)
+    has_words = counts['words'] > 0
+    words = np.where(has_words, counts['words'], 1)
+    sentences = np.maximum(counts['sentences'], 1)
+
+    with np.errstate(invalid='ignore'):
+        sentence_length = _legacy_round(words / sentences, 1)
+        syllables_per_word = _legacy_round(counts['syllables'] / words, 1)
+        difficult_percentage = counts['difficult_words'] / words * 100
+
+        metrics = {
+            'flesch_reading_ease': _legacy_round(206.835 - 1.015 * sentence_length - 84.6 * syllables_per_word, 2),
+            'smog_index': np.where(sentences >= SMOG_MIN_SENTENCES,
+                                   _legacy_round(1.043 * np.sqrt(30 * counts['polysyllables'] / sentences) + 3.1291, 1), 0.0),
+            'flesch_kincaid_grade': _legacy_round(0.39 * sentence_length + 11.8 * syllables_per_word - 15.59, 1),
+            'coleman_liau_index': _legacy_round(0.058 * _legacy_round(_legacy_round(counts['letters'] / words, 2) * 100, 2)
+                                                - 0.296 * _legacy_round(_legacy_round(sentences / words, 2) * 100, 2) - 15.8, 2),
+            'automated_readability_index': _legacy_round(4.71 * _legacy_round(counts['characters'] / words, 2) + 0.5 * _legacy_round(words / sentences, 2) - 21.43, 1),
+            'dale_chall_readability_score': _legacy_round(0.1579 * difficult_percentage + 0.0496 * sentence_length
+                                                          + np.where(difficult_percentage > DALE_CHALL_DIFFICULT_PERCENTAGE, 3.6365, 0.0), 2),
+            'difficult_words': counts['difficult_words'],
+            'gunning_fog': _legacy_round(0.4 * (sentence_length + counts['difficult_polysyllables'] / words * 100), 2),
+        }
+
+        linsear_write = (counts['linsear_easy'] + 3 * counts['linsear_hard']) / np.maximum(counts['linsear_sentences'], 1)
+        metrics['linsear_write_formula'] = np.where(linsear_write <= 20, linsear_write - 2, linsear_write) / 2
+
+    metrics['text_standard'] = _consensus_grade(metrics)
+
+    # documents without words score 0 (textstat returns meaningless values for them)
+    for metric in METRICS:
+        metrics[metric] = np.where(has_words, metrics[metric], 0.0)
+    return metrics
+
+def _consensus_grade(metrics):
+    '''
+    Estimated school grade level: the grade most of the metrics agree on, as in textstat.text_standard
+    (which prints it as "<grade - 1>th and <grade>th grade"). Ties go to the grade appended first.
+    '''
+    import numpy as np
+    flesch_reading_ease = metrics['flesch_reading_ease']
+    flesch_grade = np.select([(flesch_reading_ease >= threshold) & (flesch_reading_ease < 100) for threshold, _ in FLESCH_GRADES],
+                             [grade for _, grade in FLESCH_GRADES], 13)
+    # the second Flesch grade exists only in the 60-70 band, elsewhere it is a placeholder that never counts
+    flesch_second_grade = np.where((flesch_reading_ease >= 60) & (flesch_reading_ease < 70), 9, NO_GRADE)
+
+    columns = []
+    for metric in CONSENSUS_METRICS:
+        columns.append(_legacy_round(metrics[metric]))
+        columns.append(np.ceil(metrics[metric]))
+        if metric == 'flesch_kincaid_grade':
+            columns.extend([flesch_grade, flesch_second_grade])
+    grades = np.nan_to_num(np.stack(columns, axis=1), nan=NO_GRADE).astype(np.int64)
+
+    # number of occurrences of each grade in its row; argmax returns the first of the most common ones
+    occurrences = np.stack([(grades == grades[:, [column]]).sum(axis=1) for column in range(grades.shape[1])], axis=1)
+    occurrences[grades == NO_GRADE] = 0
+    return grades[np.arange(len(grades)), occurrences.argmax(axis=1)]
+
+def compute_metrics(counts):
+    '''
+    Computes the readability metrics of print_readability for a single document, from the counts of compute_counts.
+    :return: dictionary metric name -> score
+    '''
+    metrics = compute_metrics_array(dict((field, [counts[field]]) for field in COUNT_FIELDS))
+    return dict((metric, metrics[metric][0].item()) for metric in METRICS)
+
+def save_counts(counts_path, document_IDs, titles, counts):
+    '''
+    Stores the counts of a corpus in a compressed .npz file, one array per count. Document IDs and titles
+    are stored as UTF-8 buffers with offsets, as the string tables of dump_backend.
+    '''
+    import numpy as np
+    from dump_backend import _StringArray
+    document_IDs = _StringArray.from_list([str(document_ID) for document_ID in document_IDs])
+    titles = _StringArray.from_list(titles)
+    np.savez_compressed(counts_path, doc_id=document_IDs.buffer, doc_id_offsets=document_IDs.offsets,
+                        title=titles.buffer, title_offsets=titles.offsets,
+                        **dict((field, np.asarray(counts[field], dtype=np.int64)) for field in COUNT_FIELDS))
+
+def load_counts(counts_path):
+    '''
+    Loads the counts stored by save_counts.
+    :return: tuple (document IDs, titles, dictionary count name -> array); IDs and titles are sequences of strings
+    '''
+    import numpy as np
+    from dump_backend import _StringArray
+    with np.load(counts_path) as stored_counts:
+        if 'doc_id_offsets' not in stored_counts.files: #counts saved with fixed-width string arrays
+            return stored_counts['doc_id'], stored_counts['title'], dict((field, stored_counts[field]) for field in COUNT_FIELDS)
+        return (_StringArray(stored_counts['doc_id'], stored_counts['doc_id_offsets']),
+                _StringArray(stored_counts['title'], stored_counts['title_offsets']),
+                dict((field, stored_counts[field]) for field in COUNT_FIELDS))
+
+def _read_jsonl(path):
+    open_file = gzip.open if path.endswith('.gz') else open
+    with open_file(path, 'rt', encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            record = json.loads(line)
+            yield str(record.get('pageid', record.get('title'))), record.get('title', ''), record['text']
+
+def iter_documents(source):
+    '''
+    Yields (document ID, title, text) of the documents of a corpus. The source can be:
+    - a corpus directory written by corpus_export.py (with its manifest);
+    - a directory of .txt files, e.g. written by CategoryCrawler.write_page_text;
+    - a JSONL file, optionally gzip-compressed, with one record per document including 'text';
+    - a category graph crawled with pages (gexf, graphml or bin), whose text is fetched from the API.
+    '''
+    if os.path.isdir(source):
+        if os.path.isfile(os.path.join(source, 'manifest.json')):
+            from corpus_export import iter_corpus
+            for record in iter_corpus(source):
+                yield str(record['pageid']), record['title'], record['text']
+        else:
+            for file_name in sorted(os.listdir(source)):
+                if file_name.endswith('.txt'):
+                    with open(os.path.join(source, file_name), encoding='utf-8') as txt_file:
+                        yield file_name, file_name[:-len('.txt')], txt_file.read()
+    elif source.endswith(('.gexf', '.graphml', '.bin')):
+        from compact_graph import load_graph
+        from corpus_export import EXTRACTS_PER_QUERY, _wiki_fetch_extracts, iter_graph_pages
+        page_IDs = [page_ID for page_ID, _ in iter_graph_pages(load_graph(source))]
+        for start in range(0, len(page_IDs), EXTRACTS_PER_QUERY):
+            for record in _wiki_fetch_extracts(page_IDs[start:start + EXTRACTS_PER_QUERY]).values():
+                yield str(record['pageid']), record['title'], record['text']
+    else:
+        for document in _read_jsonl(source):
+            yield document
+
+def _count_document(document, clean=True):
+    document_ID, title, text = document
+    if clean:
+        text = clean_wiki_content(text)
+    return document_ID, title, compute_counts(text)
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def extract_counts(source, counts_path, processes=DEFAULT_PROCESSES, clean=True):
+    '''
+    Count-extraction stage: streams all the documents of a corpus (see iter_documents) through a pool
+    of processes, cleaning and tokenizing each one once, and stores their counts with save_counts.
+    The metrics can then be computed, or recomputed, from the counts without reading the text again.
+    :param clean: if True, the section titles are removed with clean_wiki_content in the same pass
+    :return: tuple (document IDs, titles, dictionary count name -> array), as load_counts
+    '''
+    document_IDs = []
+    titles = []
+    counts = dict((field, []) for field in COUNT_FIELDS)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for chunk in _chunks(iter_documents(source), SCORING_CHUNK):
+            for document_ID, title, document_counts in executor.map(_count_document, chunk, [clean] * len(chunk), chunksize=max(1, len(chunk) // (processes * 4))):
+                document_IDs.append(document_ID)
+                titles.append(title)
+                for field in COUNT_FIELDS:
+                    counts[field].append(document_counts[field])
+
+    save_counts(counts_path, document_IDs, titles, counts)
+    return load_counts(counts_path)
+
+def write_scores(out_path, document_IDs, titles, counts):
+    '''
+    Computes the metrics of all the documents with compute_metrics_array, and writes one CSV row
+    per document with its counts and readability metrics.
+    :return: number of documents written
+    '''
+    metrics = compute_metrics_array(counts)
+    columns = [counts[field] for field in COUNT_FIELDS] + [metrics[metric] for metric in METRICS]
+
+    with open(out_path, 'w', newline='', encoding='utf-8') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(('doc_id', 'title') + COUNT_FIELDS + METRICS)
+        for row in zip(document_IDs, titles, *[column.tolist() for column in columns]):
+            writer.writerow(row)
+    return len(document_IDs)
+
+def score_corpus(source, out_path, processes=DEFAULT_PROCESSES, clean=True, counts_path=None):
+    '''
+    Scores all the documents of a corpus (see iter_documents): the counts are extracted by a pool of
+    processes and stored in counts_path, then the metrics are computed for all documents at once.
+    :param counts_path: .npz file where the counts are stored (default: out_path with extension .counts.npz)
+    :return: number of documents scored
+    '''
+    if counts_path is None:
+        counts_path = os.path.splitext(out_path)[0] + '.counts.npz'
+    document_IDs, titles, counts = extract_counts(source, counts_path, processes=processes, clean=clean)
+    return write_scores(out_path, document_IDs, titles, counts)
+
+def rescore(counts_path, out_path):
+    '''
+    Recomputes the metrics from the counts stored by a previous scoring, without reading any text.
+    :return: number of documents scored
+    '''
+    document_IDs, titles, counts = load_counts(counts_path)
+    return write_scores(out_path, document_IDs, titles, counts)
+
+def print_page_readability(page_name):
+    # wikipedia.page goes through the pooled client and the response cache as well
+    page = wiki_client.get_wikipedia().page(page_name)
+    page_content = page.content
+    page_summary = page.summary
+
+    print(len(page_content.splitlines()))
+    print(page_content)
+
+    print("Page content readability scores: ")
+    print_readability(page_content)
 
-page_content = wikipedia.page(page_name).content
-page_summary = wikipedia.page(page_name).summary
+    print("Clean page content readability scores: ")
+    print_readability(clean_wiki_content(page_content))
 
-print(len(page_content.splitlines()))
-print(page_content)
+    print("\nPage summary readability scores: ")
+    print_readability(page_summary)
 
-print("Page content readability scores: ")
-print_readability(page_content)
+#Call e.g.: python compute_readability.py --page "Artificial Intelligence" to print the scores of a single page, or
+#python compute_readability.py --corpus ai_corpus --out ai_readability.csv to score all the documents of a corpus.
+#The counts are kept in ai_readability.counts.npz: python compute_readability.py --rescore --counts ai_readability.counts.npz
+#recomputes the scores without reading the corpus again.
 
-print("Clean page content readability scores: ")
-print_readability(clean_wiki_content(page_content))
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Compute the readability of Wikipedia pages.')
+    parser.add_argument('--page', default='Artificial Intelligence', help='page whose readability is printed')
+    parser.add_argument('--corpus', default=None, help='corpus directory, directory of .txt files, JSONL file or graph to score')
+    parser.add_argument('--out', default='readability.csv', help='CSV file with the scores of the corpus')
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES, help='processes used to score the corpus')
+    parser.add_argument('--no-clean', action='store_true', help='score the documents without removing the section titles')
+    parser.add_argument('--counts', default=None, help='.npz file of the counts of the corpus (default: next to --out)')
+    parser.add_argument('--rescore', action='store_true', help='recompute the scores from the --counts file, without reading the corpus')
+    args = parser.parse_args(argv)
 
-print("\nPage summary readability scores: ")
-print_readability(page_summary)
+    if args.rescore:
+        if args.counts is None:
+            parser.error('--rescore requires --counts')
+        scored = rescore(args.counts, args.out)
+        print('%d documents scored in %s' % (scored, args.out))
+    elif args.corpus is None:
+        print_page_readability(args.page)
+        #get_cat_info("Mathematics")
+    else:
+        scored = score_corpus(args.corpus, args.out, processes=args.processes, clean=not args.no_clean, counts_path=args.counts)
+        print('%d documents scored in %s' % (scored, args.out))
 
-#get_cat_info("Mathematics")
 
+if __name__ == "__main__":
+    main()
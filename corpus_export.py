@@ -0,0 +1,193 @@
+'''
+Created on Oct 2026
+
+Export of the plain text of all the pages of a crawled category graph as a compressed corpus.
+Pages are fetched in batches through prop=extracts by a pool of worker threads, and written
+to gzip-compressed JSONL shards (one JSON record per page: pageid, title, url, text).
+A manifest in the output directory records the completed shards and pages, so that an
+interrupted export resumes from where it stopped.
+'''
+import argparse
+import gzip
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from compact_graph import load_graph, node_attributes
+import crawl_stats
+import wiki_cache
+import wiki_client
+from wiki_crawler_desira import CategoryCrawler, _wiki_iter_continued_query
+
+EXTRACTS_PER_QUERY = 20 #maximum number of extracts the API accepts in a single query
+DEFAULT_SHARD_SIZE = 1000 #pages per shard
+DEFAULT_WORKERS = 8 #batches of pages fetched concurrently
+BATCHES_IN_FLIGHT_PER_WORKER = 2 #batches submitted ahead of the writer, which bounds the extracts kept in memory
+MANIFEST_FILE = 'manifest.json'
+SHARD_FILE = 'corpus-%05d.jsonl.gz'
+
+
+def _wiki_fetch_extracts(page_IDs):
+    '''
+    Fetches the plain text of the given pages with prop=extracts, following the continuation
+    (the API may return the full text of fewer pages than requested in each response).
+    :return: dictionary page ID -> record with pageid, title, url and text (pages without text are not included)
+    '''
+    search_extracts = {
+        'pageids': '|'.join(str(page_ID) for page_ID in page_IDs),
+        'prop': 'extracts|info',
+        'explaintext': '',
+        'exlimit': 'max',
+        'inprop': 'url'
+    }
+
+    records = {}
+    for page in _wiki_iter_continued_query(search_extracts):
+        if 'extract' in page and not 'missing' in page:
+            records[page['pageid']] = {'pageid': page['pageid'], 'title': page['title'], 'url': page.get('fullurl'), 'text': page['extract']}
+    return records
+
+
+def iter_graph_pages(category_graph):
+    '''
+    Yields (page ID, title) of the pages (not the categories) in a category graph, once each.
+    '''
+    seen_IDs = set()
+    for node, node_data in category_graph.nodes(data=True):
+        attributes = node_attributes(node_data)
+        page_ID = attributes.get('id')
+        title = attributes.get('title', '')
+        if isinstance(page_ID, int) and not title.startswith('Category:') and page_ID not in seen_IDs:
+            seen_IDs.add(page_ID)
+            yield page_ID, title
+
+
+def _load_manifest(out_dir):
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    return {'shards': [], 'skipped': []}
+
+
+def _save_manifest(out_dir, manifest):
+    # written to a temporary file first, so that a crash never leaves a truncated manifest
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def export_corpus(category_graph, out_dir, workers=DEFAULT_WORKERS, shard_size=DEFAULT_SHARD_SIZE):
+    '''
+    Writes the text of all the pages of the graph to gzip-compressed JSONL shards in out_dir.
+    Pages already recorded in the manifest of out_dir are skipped, so the export can be resumed.
+    :param category_graph: graph built by CategoryCrawler with include_pages=True
+    :param out_dir: output directory, created if missing
+    :param workers: number of batches of pages fetched concurrently
+    :param shard_size: number of pages per shard
+    :return: number of pages written by this call
+    '''
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    manifest = _load_manifest(out_dir)
+    done_IDs = set(manifest['skipped'])
+    for shard in manifest['shards']:
+        done_IDs.update(shard['pageids'])
+
+    pending_IDs = [page_ID for page_ID, _ in iter_graph_pages(category_graph) if page_ID not in done_IDs]
+    batches = [pending_IDs[start:start + EXTRACTS_PER_QUERY] for start in range(0, len(pending_IDs), EXTRACTS_PER_QUERY)]
+
+    written = 0
+    shard_file = None
+    shard_IDs = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # the batches are written in order, and the next batch is submitted as each one is written, so that
+        # a slow batch holds back at most workers * BATCHES_IN_FLIGHT_PER_WORKER batches of extracts
+        next_batches = iter(batches)
+        in_flight = deque((batch, executor.submit(_wiki_fetch_extracts, batch))
+                          for batch in islice(next_batches, workers * BATCHES_IN_FLIGHT_PER_WORKER))
+
+        while in_flight:
+            batch, future = in_flight.popleft()
+            records = future.result()
+            next_batch = next(next_batches, None)
+            if next_batch is not None:
+                in_flight.append((next_batch, executor.submit(_wiki_fetch_extracts, next_batch)))
+
+            for page_ID in batch:
+                if page_ID not in records:
+                    manifest['skipped'].append(page_ID)
+                    continue
+
+                if shard_file is None:
+                    shard_name = SHARD_FILE % len(manifest['shards'])
+                    shard_file = gzip.open(os.path.join(out_dir, shard_name), 'wt', encoding='utf-8')
+
+                shard_file.write(json.dumps(records[page_ID]) + '\n')
+                shard_IDs.append(page_ID)
+                written += 1
+
+                if len(shard_IDs) >= shard_size:
+                    shard_file.close()
+                    manifest['shards'].append({'file': shard_name, 'pageids': shard_IDs})
+                    _save_manifest(out_dir, manifest)
+                    shard_file = None
+                    shard_IDs = []
+
+    if shard_file is not None:
+        shard_file.close()
+        manifest['shards'].append({'file': shard_name, 'pageids': shard_IDs})
+    _save_manifest(out_dir, manifest)
+
+    return written
+
+
+def iter_corpus(corpus_dir):
+    '''
+    Yields the records (pageid, title, url, text) of a corpus written by export_corpus.
+    '''
+    for shard in _load_manifest(corpus_dir)['shards']:
+        with gzip.open(os.path.join(corpus_dir, shard['file']), 'rt', encoding='utf-8') as shard_file:
+            for line in shard_file:
+                yield json.loads(line)
+
+
+#Call e.g.: python corpus_export.py "Category:Artificial intelligence" 2 ai_corpus, and it will crawl the category
+#with its pages up to depth 2, and save the text of the pages in ai_corpus. Use --graph to export an existing graph.
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Export the text of the pages of a Wikipedia category as a compressed JSONL corpus.')
+    parser.add_argument('portal', nargs='?', help='category to crawl, e.g. "Category:Artificial intelligence"')
+    parser.add_argument('subcategory_depth', nargs='?', type=int, default=1, help='depth to explore in the tree of subcategories')
+    parser.add_argument('out_dir', nargs='?', default='corpus', help='output directory')
+    parser.add_argument('--graph', default=None, help='graph crawled with pages (gexf, graphml or bin), used instead of crawling the portal')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of batches of pages fetched concurrently')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='number of pages per shard')
+    wiki_cache.add_cache_arguments(parser)
+    crawl_stats.add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+
+    wiki_client.configure(pool_size=max(wiki_client.POOL_SIZE, args.workers), cache=wiki_cache.cache_from_args(args))
+    crawl_stats.setup_from_args(args)
+
+    if args.graph is not None:
+        category_graph = load_graph(args.graph)
+    elif args.portal is not None:
+        d = CategoryCrawler(args.portal)
+        d.search_and_store_graph_concurrent(args.portal, cat_page_id='unknown', subcategory_depth=args.subcategory_depth, max_depth=10, parent_node="root_node", include_pages=True, node_type='url', workers=args.workers)
+        category_graph = d.get_category_graph()
+    else:
+        parser.error('either a portal or --graph is required')
+
+    written = export_corpus(category_graph, args.out_dir, workers=args.workers, shard_size=args.shard_size)
+    print('%d pages written in %s' % (written, args.out_dir))
+    crawl_stats.write_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+'''
+Created on Oct 2026
+
+Instrumentation of the crawls. The shared client of wiki_client.py records every API request
+(count per action, latency, bytes received, retries, cache hits), the crawlers time their steps
+(fetching and storing categories, wikipedia.page calls) and count the nodes they add to the graph.
+Everything goes to the module-level CrawlStats object, stats, which can be written as a JSON
+report or as a Prometheus textfile (for the textfile collector of node_exporter).
+
+The command line scripts add the options with add_stats_arguments, and also set the level of the
+logging that replaced the per-node prints: --log-level WARNING switches the per-node lines off.
+'''
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+PERCENTILES = (50, 90, 99)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) #seconds, for the Prometheus histograms
+METRIC_PREFIX = 'desira_crawl'
+
+
+class CrawlStats(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            # endpoint -> {'requests', 'cache_hits', 'bytes', 'retries', 'errors'}, and endpoint -> latencies of the requests sent
+            self.endpoints = {}
+            self.latencies = {}
+            # step -> [calls, total seconds]
+            self.steps = {}
+            self.counters = {}
+
+    def _endpoint(self, endpoint):
+        counts = self.endpoints.get(endpoint)
+        if counts is None:
+            counts = {'requests': 0, 'cache_hits': 0, 'bytes': 0, 'retries': 0, 'errors': 0}
+            self.endpoints[endpoint] = counts
+            self.latencies[endpoint] = array('d')
+        return counts
+
+    def record_request(self, endpoint, seconds, received_bytes=0, cached=False, retries=0, error=False):
+        '''
+        Records an API request: answered by the cache, or sent to the server in the given seconds.
+        '''
+        with self._lock:
+            counts = self._endpoint(endpoint)
+            counts['requests'] += 1
+            counts['retries'] += retries
+            if error:
+                counts['errors'] += 1
+            if cached:
+                counts['cache_hits'] += 1
+            else:
+                counts['bytes'] += received_bytes
+                self.latencies[endpoint].append(seconds)
+
+    def sent_requests(self):
+        '''
+        :return: number of API requests sent to the server so far (the requests answered by the cache are not counted)
+        '''
+        with self._lock:
+            return sum(counts['requests'] - counts['cache_hits'] for counts in self.endpoints.values())
+
+    def count(self, counter, increment=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + increment
+
+    @contextmanager
+    def timer(self, step):
+        '''
+        Context manager that adds the time spent in the block to the step.
+        '''
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                calls_time = self.steps.setdefault(step, [0, 0.0])
+                calls_time[0] += 1
+                calls_time[1] += elapsed
+
+    def report(self):
+        '''
+        :return: dictionary with the elapsed time, the statistics of each endpoint and step, the counters and the nodes per second
+        '''
+        import numpy as np
+        with self._lock:
+            elapsed = time.time() - self.start_time
+            endpoints = {}
+            for endpoint, counts in self.endpoints.items():
+                latencies = np.array(self.latencies[endpoint], dtype=np.float64) #copied, the array keeps growing
+                endpoint_report = dict(counts)
+                endpoint_report['cache_hit_rate'] = counts['cache_hits'] / counts['requests']
+                endpoint_report['latency'] = {'mean': float(latencies.mean()) if len(latencies) else None,
+                                              'max': float(latencies.max()) if len(latencies) else None}
+                for percentile in PERCENTILES:
+                    endpoint_report['latency']['p%d' % percentile] = float(np.percentile(latencies, percentile)) if len(latencies) else None
+                endpoints[endpoint] = endpoint_report
+
+            steps = dict((step, {'calls': calls, 'seconds': seconds}) for step, (calls, seconds) in self.steps.items())
+            counters = dict(self.counters)
+
+        requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+        cache_hits = sum(endpoint['cache_hits'] for endpoint in endpoints.values())
+        nodes = counters.get('category_nodes', 0) + counters.get('page_nodes', 0)
+        return {
+            'elapsed_seconds': elapsed,
+            'requests': requests,
+            'bytes': sum(endpoint['bytes'] for endpoint in endpoints.values()),
+            'cache_hit_rate': cache_hits / requests if requests else None,
+            'nodes_per_second': nodes / elapsed if elapsed > 0 else None,
+            'endpoints': endpoints,
+            'steps': steps,
+            'counters': counters
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(self.report(), report_file, indent=2, sort_keys=True)
+
+    def write_prometheus(self, path):
+        '''
+        Writes the statistics in the Prometheus text format. The file is written to a temporary
+        file first, so that the collector never reads a partial file.
+        '''
+        import numpy as np
+        report = self.report()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (METRIC_PREFIX, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (METRIC_PREFIX, name, metric_type))
+            for labels, value in samples:
+                label_text = ','.join('%s="%s"' % (label, str(label_value).replace('\\', '\\\\').replace('"', '\\"')) for label, label_value in labels)
+                lines.append('%s_%s%s %s' % (METRIC_PREFIX, name, '{%s}' % label_text if label_text else '', repr(float(value))))
+
+        endpoints = sorted(report['endpoints'].items())
+        metric('requests_total', 'counter', 'API requests, including those answered by the cache.',
+               [((('endpoint', endpoint),), counts['requests']) for endpoint, counts in endpoints])
+        metric('cache_hits_total', 'counter', 'API requests answered by the response cache.',
+               [((('endpoint', endpoint),), counts['cache_hits']) for endpoint, counts in endpoints])
+        metric('retries_total', 'counter', 'API requests retried after a transient error.',
+               [((('endpoint', endpoint),), counts['retries']) for endpoint, counts in endpoints])
+        metric('response_bytes_total', 'counter', 'Bytes received from the API.',
+               [((('endpoint', endpoint),), counts['bytes']) for endpoint, counts in endpoints])
+
+        with self._lock:
+            latencies = dict((endpoint, np.array(self.latencies[endpoint], dtype=np.float64)) for endpoint, _ in endpoints)
+        lines.append('# HELP %s_request_seconds Latency of the API requests sent to the server.' % METRIC_PREFIX)
+        lines.append('# TYPE %s_request_seconds histogram' % METRIC_PREFIX)
+        for endpoint, _ in endpoints:
+            for bucket in LATENCY_BUCKETS + ('+Inf',):
+                in_bucket = len(latencies[endpoint]) if bucket == '+Inf' else np.count_nonzero(latencies[endpoint] <= bucket)
+                lines.append('%s_request_seconds_bucket{endpoint="%s",le="%s"} %d' % (METRIC_PREFIX, endpoint, bucket, in_bucket))
+            lines.append('%s_request_seconds_sum{endpoint="%s"} %r' % (METRIC_PREFIX, endpoint, float(latencies[endpoint].sum())))
+            lines.append('%s_request_seconds_count{endpoint="%s"} %d' % (METRIC_PREFIX, endpoint, len(latencies[endpoint])))
+
+        metric('step_seconds_total', 'counter', 'Time spent in each step of the crawl.',
+               [((('step', step),), step_report['seconds']) for step, step_report in sorted(report['steps'].items())])
+        metric('step_calls_total', 'counter', 'Calls of each step of the crawl.',
+               [((('step', step),), step_report['calls']) for step, step_report in sorted(report['steps'].items())])
+        metric('items_total', 'counter', 'Nodes and other items counted by the crawlers.',
+               [((('item', counter),), value) for counter, value in sorted(report['counters'].items())])
+        metric('elapsed_seconds', 'gauge', 'Seconds since the statistics were reset.', [((), report['elapsed_seconds'])])
+
+        with open(path + '.tmp', 'w', encoding='utf-8') as textfile:
+            textfile.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+
+stats = CrawlStats()
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats the log records as JSON lines, with the fields passed through extra.
+    '''
+    RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'logger': record.name, 'message': record.getMessage().strip()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in self.RECORD_FIELDS)
+        return json.dumps(entry, default=str)
+
+
+def add_stats_arguments(parser):
+    '''
+    Adds the command line options of the instrumentation and of the logging to an argparse parser.
+    '''
+    parser.add_argument('--stats-report', default=None, help='JSON file where the statistics of the crawl are written')
+    parser.add_argument('--prometheus-textfile', default=None, help='file where the statistics are written in the Prometheus text format')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help='INFO logs the crawled categories, DEBUG also the pages, WARNING switches the per-node logging off')
+    parser.add_argument('--log-json', action='store_true', help='log JSON lines with the fields of each record')
+
+
+def setup_from_args(args):
+    '''
+    Configures the logging from the options of add_stats_arguments, and resets the statistics.
+    '''
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if args.log_json else logging.Formatter('%(message)s'))
+    logging.basicConfig(level=args.log_level, handlers=[handler])
+    logging.getLogger('urllib3').setLevel(logging.WARNING) #one line per connection and request otherwise
+    stats.reset()
+
+
+def write_from_args(args):
+    '''
+    Writes the reports requested by the options of add_stats_arguments.
+    '''
+    if args.stats_report is not None:
+        stats.write_json(args.stats_report)
+    if args.prometheus_textfile is not None:
+        stats.write_prometheus(args.prometheus_textfile)
@@ -0,0 +1,43 @@
+'''
+Created on Oct 2026
+
+Single entry point of the scripts of the repository, with one subcommand per script:
+- crawl: crawl the tree of subcategories of a category (wiki_crawler_desira.py)
+- overlap: compare the category graphs of two or more portals (common_link_crawler.py)
+- readability: score the readability of a page or of a corpus (compute_readability.py)
+- export: export the text of the pages of a category as a corpus (corpus_export.py)
+Only the module of the subcommand is imported, and the heavy libraries (wikipedia with
+BeautifulSoup, networkx, numpy, textstat) are imported by the modules on first use, so that
+short batch invocations do not pay for the libraries they do not need.
+
+Call e.g.: python desira.py crawl "Category:Artificial intelligence" 2
+or: python desira.py overlap "Category:Emerging technologies" "Category:Artificial intelligence" 1 -m
+and: python desira.py <command> --help for the options of each command.
+'''
+import argparse
+import importlib
+import sys
+
+# command -> (module whose main is run, description)
+COMMANDS = {
+    'crawl': ('wiki_crawler_desira', 'crawl the tree of subcategories of a category'),
+    'overlap': ('common_link_crawler', 'compare the category graphs of two or more portals'),
+    'readability': ('compute_readability', 'score the readability of a page or of a corpus'),
+    'export': ('corpus_export', 'export the text of the pages of a category as a corpus')
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='desira', description='Crawl and analyse the category graphs of Wikipedia portals.',
+                                     epilog='\n'.join('%-12s %s' % (command, description) for command, (_, description) in COMMANDS.items()),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=list(COMMANDS), help='command to run')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER, help='arguments of the command (see desira <command> --help)')
+    args = parser.parse_args(argv)
+
+    module_name, _ = COMMANDS[args.command]
+    return importlib.import_module(module_name).main(args.arguments, prog='desira ' + args.command)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+'''
+Created on Oct 2026
+
+Offline backend of the crawlers (see wiki_backend.py): DumpBackend answers the queries of the
+MediaWiki API from the SQL dumps of a wiki (page, categorylinks and, optionally, pagelinks,
+redirect and linktarget tables), or from a small JSON fixture. The dumps are loaded once into
+integer arrays (pages sorted by ID, category members and page links as offsets + rows, titles
+found by binary search on sorted 64-bit keys), which can be saved in a store directory and
+memory-mapped by the next runs.
+
+Build a store with e.g.: python dump_backend.py enwiki-page.sql.gz enwiki-categorylinks.sql.gz enwiki_store --pagelinks enwiki-pagelinks.sql.gz
+and crawl it with: python wiki_crawler_desira.py "Category:Artificial intelligence" 2 --dump enwiki_store
+'''
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from urllib.parse import quote
+
+import numpy as np
+
+from wiki_backend import PageNotFound, WikiBackend
+
+WIKI_URL = 'https://en.wikipedia.org/wiki/' #prefix of the URLs of the pages of a dump
+CATEGORY_NAMESPACE = 14
+NAMESPACES = {1: 'Talk', 2: 'User', 4: 'Wikipedia', 6: 'File', 8: 'MediaWiki', 10: 'Template', 12: 'Help', 14: 'Category', 100: 'Portal'}
+MEMBER_TYPES = {CATEGORY_NAMESPACE: 'subcat', 6: 'file'} #type of a category member by namespace, 'page' for the others
+
+SQL_ROW = re.compile(r"\(((?:'(?:[^'\\]|\\.)*'|[^'()])*)\)")
+SQL_VALUE = re.compile(r"'((?:[^'\\]|\\.)*)'|(NULL)|([^,]+)")
+SQL_ESCAPE = re.compile(r"\\(.)")
+SQL_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+
+class DumpPage(object):
+    '''
+    Page returned by DumpBackend.get_page, with the attributes of wikipedia.WikipediaPage used by the crawlers.
+    '''
+
+    def __init__(self, backend, row):
+        self._backend = backend
+        self._row = row
+        self.pageid = int(backend.page_IDs[row])
+        self.title = backend._title(row)
+        self.url = backend._url(row)
+
+    @property
+    def categories(self):
+        # with spaces, as wikipedia.page(...).categories and search_pages_by_titles
+        return [self._backend.category_names[category].replace('_', ' ') for category in self._backend._page_categories(self._row)]
+
+    @property
+    def links(self):
+        return self._backend._page_links(self._row)
+
+
+class _StringArray(object):
+    '''
+    List of strings stored as a single UTF-8 buffer with offsets, which can be saved and memory-mapped.
+    '''
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        data = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        for i in range(len(offsets) - 1):
+            yield data[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+
+def _title_key(namespace, title):
+    '''
+    64-bit key of a title (database key, with underscores) in a namespace, for the sorted title indexes of DumpBackend.
+    '''
+    return int.from_bytes(hashlib.blake2b(('%d:%s' % (namespace, title)).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _title_indexes(page_namespaces, page_titles, category_names):
+    '''
+    Builds the title indexes of a store: the keys of the page titles and of the category names, sorted,
+    with the page row and the category ID of each key, so that titles are found with a binary search
+    on arrays that can be memory-mapped, instead of dictionaries built at every load.
+    '''
+    indexes = {}
+    for name, keys in (('title', [_title_key(int(namespace), title) for namespace, title in zip(page_namespaces, page_titles)]),
+                       ('category', [_title_key(CATEGORY_NAMESPACE, category_name) for category_name in category_names])):
+        keys = np.array(keys, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        indexes[name + '_keys'], indexes[name + '_key_rows'] = keys[order], order.astype(np.int64)
+    return indexes
+
+
+def _csr(keys, values, size):
+    '''
+    Groups values by integer key: returns offsets (size + 1) and the values sorted by key,
+    so that the values of key k are values[offsets[k]:offsets[k + 1]].
+    '''
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+def iter_sql_dump(path, columns):
+    '''
+    Yields the rows of the INSERT statements of a MySQL dump of a MediaWiki table, as tuples of
+    the given columns. The column order is read from the CREATE TABLE statement of the dump.
+    Strings are unescaped, NULL is None, and the other values are returned as strings.
+    '''
+    open_dump = gzip.open if path.endswith('.gz') else open
+    with open_dump(path, 'rt', encoding='utf-8', errors='replace') as dump:
+        table_columns = []
+        indexes = None
+        for line in dump:
+            if line.startswith('CREATE TABLE'):
+                table_columns = []
+            elif line.startswith('  `'):
+                table_columns.append(line.split('`')[1])
+            elif line.startswith('INSERT INTO'):
+                if indexes is None:
+                    indexes = [table_columns.index(column) for column in columns]
+                for row in SQL_ROW.finditer(line, line.index(' VALUES ')):
+                    values = []
+                    for string, null, other in SQL_VALUE.findall(row.group(1)):
+                        if null:
+                            values.append(None)
+                        elif other:
+                            values.append(other)
+                        else:
+                            values.append(SQL_ESCAPE.sub(lambda escape: SQL_ESCAPES.get(escape.group(1), escape.group(1)), string))
+                    yield tuple(values[index] for index in indexes)
+
+
+class DumpBackend(WikiBackend):
+
+    INDEX_ARRAYS = ('title_keys', 'title_key_rows', 'category_keys', 'category_key_rows') #built by _title_indexes
+    STORE_ARRAYS = ('page_IDs', 'page_namespaces', 'page_redirects', 'member_offsets', 'member_rows',
+                    'category_offsets', 'category_IDs', 'link_offsets', 'link_targets', 'target_namespaces') + INDEX_ARRAYS
+    STORE_STRINGS = ('page_titles', 'page_touched', 'category_names', 'target_titles')
+
+    def __init__(self, arrays, base_url=WIKI_URL):
+        '''
+        Use from_rows, from_dumps, from_fixture or load to create a backend.
+        :param arrays: dictionary with the STORE_ARRAYS and STORE_STRINGS of the store
+        '''
+        if not all(name in arrays for name in self.INDEX_ARRAYS): #store saved without the title indexes
+            arrays = dict(arrays, **_title_indexes(arrays['page_namespaces'], arrays['page_titles'], arrays['category_names']))
+        for name in self.STORE_ARRAYS + self.STORE_STRINGS:
+            setattr(self, name, arrays[name])
+        self.base_url = base_url
+
+    @classmethod
+    def from_rows(cls, pages, categorylinks, pagelinks=(), redirects=(), base_url=WIKI_URL):
+        '''
+        :param pages: iterable of (page ID, namespace, title, is redirect, touched)
+        :param categorylinks: iterable of (member page ID, category name)
+        :param pagelinks: iterable of (page ID, target namespace, target title)
+        :param redirects: iterable of (page ID, target namespace, target title)
+        Titles are database keys, i.e. with underscores and without the namespace prefix.
+        '''
+        pages = sorted((int(page_ID), int(namespace), title, int(is_redirect or 0), touched or '') for page_ID, namespace, title, is_redirect, touched in pages)
+        page_IDs = np.array([page[0] for page in pages], dtype=np.int64)
+        arrays = {
+            'page_IDs': page_IDs,
+            'page_namespaces': np.array([page[1] for page in pages], dtype=np.int32),
+            'page_titles': [page[2] for page in pages],
+            'page_touched': [page[4] for page in pages]
+        }
+        rows = dict(zip(page_IDs.tolist(), range(len(pages))))
+        target_rows = dict(((page[1], page[2]), row) for row, page in enumerate(pages))
+
+        # categories are addressed by name: a category can have members without having a page
+        category_names = {}
+        member_categories, member_rows = [], []
+        for page_ID, category_name in categorylinks:
+            row = rows.get(int(page_ID))
+            if row is not None:
+                member_categories.append(category_names.setdefault(category_name, len(category_names)))
+                member_rows.append(row)
+        arrays['category_names'] = list(category_names)
+        arrays['member_offsets'], arrays['member_rows'] = _csr(member_categories, member_rows, len(category_names))
+        arrays['category_offsets'], arrays['category_IDs'] = _csr(member_rows, member_categories, len(pages))
+
+        # link targets are addressed by (namespace, title): a link can point to a missing page
+        targets = {}
+        link_rows, link_targets = [], []
+        for page_ID, namespace, title in pagelinks:
+            row = rows.get(int(page_ID))
+            if row is not None:
+                link_rows.append(row)
+                link_targets.append(targets.setdefault((int(namespace), title), len(targets)))
+        arrays['target_namespaces'] = np.array([namespace for namespace, _ in targets], dtype=np.int32)
+        arrays['target_titles'] = [title for _, title in targets]
+        arrays['link_offsets'], arrays['link_targets'] = _csr(link_rows, link_targets, len(pages))
+
+        page_redirects = np.full(len(pages), -1, dtype=np.int64)
+        for page_ID, namespace, title in redirects:
+            row = rows.get(int(page_ID))
+            if row is not None:
+                page_redirects[row] = target_rows.get((int(namespace), title), -1)
+        arrays['page_redirects'] = page_redirects
+        arrays.update(_title_indexes(arrays['page_namespaces'], arrays['page_titles'], arrays['category_names']))
+
+        return cls(arrays, base_url)
+
+    @classmethod
+    def from_dumps(cls, page_dump, categorylinks_dump, pagelinks_dump=None, redirect_dump=None, linktarget_dump=None, base_url=WIKI_URL):
+        '''
+        Loads the SQL dumps of the page, categorylinks, pagelinks, redirect and linktarget tables.
+        pagelinks dumps with pl_target_id (MediaWiki >= 1.43) require the linktarget dump.
+        '''
+        pages = iter_sql_dump(page_dump, ('page_id', 'page_namespace', 'page_title', 'page_is_redirect', 'page_touched'))
+        categorylinks = iter_sql_dump(categorylinks_dump, ('cl_from', 'cl_to'))
+
+        pagelinks = ()
+        if pagelinks_dump is not None:
+            if linktarget_dump is not None:
+                link_targets = dict((lt_id, (namespace, title)) for lt_id, namespace, title in iter_sql_dump(linktarget_dump, ('lt_id', 'lt_namespace', 'lt_title')))
+                pagelinks = ((page_ID,) + link_targets[lt_id] for page_ID, lt_id in iter_sql_dump(pagelinks_dump, ('pl_from', 'pl_target_id')) if lt_id in link_targets)
+            else:
+                pagelinks = iter_sql_dump(pagelinks_dump, ('pl_from', 'pl_namespace', 'pl_title'))
+
+        redirects = iter_sql_dump(redirect_dump, ('rd_from', 'rd_namespace', 'rd_title')) if redirect_dump is not None else ()
+
+        return cls.from_rows(pages, categorylinks, pagelinks, redirects, base_url)
+
+    @classmethod
+    def from_fixture(cls, path, base_url=WIKI_URL):
+        '''
+        Loads a JSON fixture with the lists 'page' ([page ID, namespace, title, is redirect, touched]),
+        'categorylinks' ([page ID, category name]) and, optionally, 'pagelinks' and 'redirect'
+        ([page ID, target namespace, target title]).
+        '''
+        with open(path, encoding='utf-8') as fixture_file:
+            fixture = json.load(fixture_file)
+        return cls.from_rows(fixture['page'], fixture['categorylinks'], fixture.get('pagelinks', ()), fixture.get('redirect', ()), base_url)
+
+    def save(self, store_dir):
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        for name in self.STORE_ARRAYS:
+            np.save(os.path.join(store_dir, name + '.npy'), getattr(self, name))
+        for name in self.STORE_STRINGS:
+            strings = getattr(self, name)
+            if not isinstance(strings, _StringArray):
+                strings = _StringArray.from_list(strings)
+            np.save(os.path.join(store_dir, name + '.npy'), strings.buffer)
+            np.save(os.path.join(store_dir, name + '_offsets.npy'), strings.offsets)
+        with open(os.path.join(store_dir, 'store.json'), 'w', encoding='utf-8') as store_file:
+            json.dump({'base_url': self.base_url}, store_file)
+
+    @classmethod
+    def load(cls, store_dir):
+        '''
+        Loads a store saved by save, memory-mapping its arrays.
+        '''
+        with open(os.path.join(store_dir, 'store.json'), encoding='utf-8') as store_file:
+            base_url = json.load(store_file)['base_url']
+        arrays = {}
+        for name in cls.STORE_ARRAYS:
+            if name in cls.INDEX_ARRAYS and not os.path.isfile(os.path.join(store_dir, name + '.npy')):
+                continue #store saved without the title indexes, rebuilt by the constructor
+            arrays[name] = np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='r')
+        for name in cls.STORE_STRINGS:
+            arrays[name] = _StringArray(np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='r'),
+                                        np.load(os.path.join(store_dir, name + '_offsets.npy'), mmap_mode='r'))
+        return cls(arrays, base_url)
+
+    def _split_title(self, title):
+        '''
+        Returns (namespace, database key) of a title, e.g. 'Category:Machine learning' -> (14, 'Machine_learning').
+        '''
+        namespace = 0
+        prefix, _, name = title.partition(':')
+        for namespace_ID, namespace_name in NAMESPACES.items():
+            if name and prefix.strip().lower() == namespace_name.lower():
+                namespace, title = namespace_ID, name
+                break
+        title = '_'.join(title.replace('_', ' ').split())
+        return namespace, title[:1].upper() + title[1:]
+
+    def _title(self, row):
+        title = self.page_titles[row].replace('_', ' ')
+        namespace = int(self.page_namespaces[row])
+        return NAMESPACES[namespace] + ':' + title if namespace in NAMESPACES else title
+
+    def _url(self, row):
+        return self.base_url + quote(self._title(row).replace(' ', '_'), safe=";@$!*(),/~:")
+
+    def _lookup(self, keys, key_rows, key, matches):
+        '''
+        Binary search of a title key: returns the row of the first key equal to key whose title matches
+        (keys of different titles can collide), or None.
+        '''
+        key = np.uint64(key)
+        i = int(np.searchsorted(keys, key))
+        while i < len(keys) and keys[i] == key:
+            row = int(key_rows[i])
+            if matches(row):
+                return row
+            i += 1
+        return None
+
+    def _category_ID(self, category_name):
+        return self._lookup(self.category_keys, self.category_key_rows, _title_key(CATEGORY_NAMESPACE, category_name),
+                            lambda category_ID: self.category_names[category_ID] == category_name)
+
+    def _find_row(self, title, follow_redirects=True):
+        namespace, title = self._split_title(title)
+        row = self._lookup(self.title_keys, self.title_key_rows, _title_key(namespace, title),
+                           lambda row: self.page_titles[row] == title and int(self.page_namespaces[row]) == namespace)
+        if row is not None and follow_redirects and self.page_redirects[row] >= 0:
+            row = int(self.page_redirects[row])
+        return row
+
+    def _page_categories(self, row):
+        return self.category_IDs[self.category_offsets[row]:self.category_offsets[row + 1]].tolist()
+
+    def _page_links(self, row):
+        targets = self.link_targets[self.link_offsets[row]:self.link_offsets[row + 1]].tolist()
+        return sorted(self.target_titles[target].replace('_', ' ') for target in targets if self.target_namespaces[target] == 0)
+
+    def _page_info(self, row):
+        return {'pageid': int(self.page_IDs[row]), 'ns': int(self.page_namespaces[row]), 'title': self._title(row),
+                'fullurl': self._url(row), 'touched': self.page_touched[row]}
+
+    def _find_ID_row(self, page_ID):
+        row = int(np.searchsorted(self.page_IDs, int(page_ID)))
+        return row if row < len(self.page_IDs) and self.page_IDs[row] == int(page_ID) else None
+
+    def iter_category_members(self, cat_title, cat_page_id='unknown', member_types='page|subcat'):
+        if cat_page_id != 'unknown':
+            row = self._find_ID_row(cat_page_id)
+            if row is not None:
+                cat_title = self._title(row)
+        category_ID = self._category_ID(self._split_title(cat_title)[1])
+        if category_ID is None:
+            return
+        member_types = member_types.split('|')
+
+        for row in self.member_rows[self.member_offsets[category_ID]:self.member_offsets[category_ID + 1]].tolist():
+            if MEMBER_TYPES.get(int(self.page_namespaces[row]), 'page') in member_types:
+                member = self._page_info(row)
+                member['categories'] = ['Category:' + self.category_names[category].replace('_', ' ') for category in self._page_categories(row)]
+                yield member
+
+    def search_cat_ID_by_name(self, cat_name):
+        row = self._find_row(cat_name, follow_redirects=False)
+        return int(self.page_IDs[row]) if row is not None else -1
+
+    def search_url_by_ID(self, page_ID):
+        row = self._find_ID_row(page_ID)
+        if row is None:
+            raise KeyError(page_ID)
+        return self._url(row)
+
+    def search_info_by_IDs(self, page_IDs):
+        pages_info = {}
+        for page_ID in page_IDs:
+            row = self._find_ID_row(page_ID)
+            if row is not None:
+                pages_info[page_ID] = self._page_info(row)
+        return pages_info
+
+    def search_pages_by_titles(self, titles, stop=None):
+        # the dumps do not say which pages are disambiguation pages: they are resolved as the others
+        resolved_pages = {}
+        for title in titles:
+            row = self._find_row(title)
+            if row is not None:
+                categories = [self.category_names[category].replace('_', ' ') for category in self._page_categories(row)]
+                resolved_pages[title] = (self._title(row), self._url(row), categories)
+        return resolved_pages
+
+    def search_links_by_titles(self, titles, stop=None):
+        page_links = {}
+        for title in titles:
+            row = self._find_row(title)
+            if row is not None:
+                page_links[title] = self._page_links(row)
+        return page_links
+
+    def search_main_pages_by_IDs(self, cat_IDs):
+        # the dumps do not have the wikitext of the categories: the main page is the article with the name of the category
+        main_pages = {}
+        for cat_ID in cat_IDs:
+            cat_row = self._find_ID_row(cat_ID)
+            row = self._find_row(self.page_titles[cat_row]) if cat_row is not None else None
+            main_pages[cat_ID] = self._url(row) if row is not None else None
+        return main_pages
+
+    def get_page(self, title):
+        row = self._find_row(title)
+        if row is None:
+            raise PageNotFound('Page id "%s" does not match any pages. Try another id!' % title)
+        return DumpPage(self, row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a local store from the SQL dumps of a MediaWiki wiki, for crawling with --dump.')
+    parser.add_argument('page_dump', help='dump of the page table, e.g. enwiki-latest-page.sql.gz')
+    parser.add_argument('categorylinks_dump', help='dump of the categorylinks table')
+    parser.add_argument('store_dir', help='output directory of the store')
+    parser.add_argument('--pagelinks', default=None, help='dump of the pagelinks table')
+    parser.add_argument('--linktarget', default=None, help='dump of the linktarget table (required by pagelinks dumps with pl_target_id)')
+    parser.add_argument('--redirect', default=None, help='dump of the redirect table')
+    parser.add_argument('--base-url', default=WIKI_URL, help='prefix of the page URLs')
+    args = parser.parse_args()
+
+    backend = DumpBackend.from_dumps(args.page_dump, args.categorylinks_dump, args.pagelinks, args.redirect, args.linktarget, args.base_url)
+    backend.save(args.store_dir)
+    print('%d pages and %d categories saved in %s' % (len(backend.page_IDs), len(backend.category_names), args.store_dir))
+
+
+if __name__ == "__main__":
+    main()
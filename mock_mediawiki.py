@@ -0,0 +1,278 @@
+'''
+Created on Oct 2026
+
+Local stand-in for the MediaWiki API, serving a synthetic wiki, used by benchmark_crawlers.py to
+measure the crawlers offline. SyntheticWiki generates one category tree per portal with a given
+fan-out and depth, optional cycles (subcategories pointing back to categories of upper levels),
+pages shared by the categories of different portals, links between pages, main articles declared
+with {{Cat main}}, and a short text for each page. MockMediaWiki answers the queries used by the
+scripts of this repository and by the wikipedia library (titles/pageids with prop=info, categories,
+links, pageprops, revisions and extracts, generator=categorymembers with continuation, list=search),
+optionally waiting a fixed latency before each answer, and counts the requests it receives.
+
+Call e.g.: python mock_mediawiki.py --fanout 4 --depth 3 --port 8080, and point API_URL to http://127.0.0.1:8080/api.php
+'''
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse, quote
+
+WIKI_URL = 'https://en.wikipedia.org/wiki/'
+CATEGORY_NAMESPACE = 14
+MEMBERS_PER_RESPONSE = 50 #members per categorymembers response, lower than the API limit to exercise the continuation
+WORDS = ('the', 'crawler', 'category', 'system', 'of', 'a', 'page', 'is', 'linked', 'to', 'knowledge', 'and', 'graph',
+         'reads', 'information', 'network', 'artificial', 'intelligence', 'with', 'many', 'technologies', 'in', 'research')
+
+
+class SyntheticWiki(object):
+
+    def __init__(self, portals=2, fanout=3, depth=2, pages_per_category=5, cycles=0, overlap=0.2, links_per_page=5, seed=0):
+        '''
+        :param portals: number of category trees, with roots 'Category:Portal 0', 'Category:Portal 1', ...
+        :param fanout: subcategories of each category above the last level
+        :param depth: levels of subcategories below each root
+        :param pages_per_category: pages of each category
+        :param cycles: number of subcategory edges pointing back to a category of an upper level of the same tree
+        :param overlap: probability that a page also belongs to a category of another portal
+        :param links_per_page: links from each page to random pages
+        :param seed: seed of the generator, so that the same parameters give the same wiki
+        '''
+        generator = random.Random(seed)
+        # page ID -> {'ns', 'title', 'members' (categories), 'categories', 'links', 'wikitext', 'text'}
+        self.pages = {}
+        self.ids = {}
+        self.roots = []
+
+        portal_categories = []
+        for portal in range(portals):
+            root = self._add_page(CATEGORY_NAMESPACE, 'Category:Portal %d' % portal)
+            self.roots.append(self.pages[root]['title'])
+            levels = [[root]]
+            for level in range(depth):
+                levels.append([])
+                for parent in levels[level]:
+                    for _ in range(fanout):
+                        category = self._add_page(CATEGORY_NAMESPACE, 'Category:Portal %d topic %d' % (portal, len(self.pages)))
+                        self._categorize(category, parent)
+                        levels[-1].append(category)
+            categories = [category for level in levels for category in level]
+            portal_categories.append(categories)
+
+            for _ in range(cycles if depth > 0 else 0):
+                level = generator.randrange(1, depth + 1)
+                self._categorize(generator.choice(levels[generator.randrange(0, level)]), generator.choice(levels[level]))
+
+        article_IDs = []
+        for portal, categories in enumerate(portal_categories):
+            for category in categories:
+                # main article, declared with {{Cat main}} in half of the categories, and named as the category in all of them
+                main_article = self._add_page(0, self.pages[category]['title'][len('Category:'):])
+                self._categorize(main_article, category)
+                if category % 2 == 0:
+                    self.pages[category]['wikitext'] = '{{Cat main|%s}}\nPages about %s.' % (self.pages[main_article]['title'], self.pages[main_article]['title'])
+                article_IDs.append(main_article)
+
+                for _ in range(pages_per_category):
+                    page = self._add_page(0, 'Page %d' % len(self.pages))
+                    self._categorize(page, category)
+                    if len(portal_categories) > 1 and generator.random() < overlap:
+                        other_portal = generator.choice([other for other in range(len(portal_categories)) if other != portal])
+                        self._categorize(page, generator.choice(portal_categories[other_portal]))
+                    article_IDs.append(page)
+
+        for page in article_IDs:
+            self.pages[page]['links'] = [self.pages[generator.choice(article_IDs)]['title'] for _ in range(links_per_page)]
+            self.pages[page]['text'] = ' '.join(' '.join(generator.choice(WORDS) for _ in range(generator.randrange(5, 20))).capitalize() + '.'
+                                                for _ in range(generator.randrange(3, 10)))
+
+    def _add_page(self, namespace, title):
+        page_ID = len(self.pages) + 1
+        self.pages[page_ID] = {'ns': namespace, 'title': title, 'members': [], 'categories': [], 'links': [], 'wikitext': '', 'text': ''}
+        self.ids[title] = page_ID
+        return page_ID
+
+    def _categorize(self, page_ID, category_ID):
+        if not category_ID in self.pages[page_ID]['categories']:
+            self.pages[page_ID]['categories'].append(category_ID)
+            self.pages[category_ID]['members'].append(page_ID)
+
+    def find(self, title):
+        title = ' '.join(title.replace('_', ' ').split())
+        return self.ids.get(title[:1].upper() + title[1:]) if title else None
+
+    def url(self, page_ID):
+        return WIKI_URL + quote(self.pages[page_ID]['title'].replace(' ', '_'))
+
+
+class MockMediaWiki(object):
+
+    def __init__(self, wiki, latency=0.0, host='127.0.0.1', port=0, request_counter=None):
+        '''
+        :param wiki: SyntheticWiki to serve
+        :param latency: seconds waited before answering each request
+        :param port: port of the server (0: any free port)
+        :param request_counter: multiprocessing.Value where the requests are counted, to read them from
+        another process (see MockMediaWikiProcess); a new one if None
+        '''
+        self.wiki = wiki
+        self.latency = latency
+        self._request_counter = request_counter if request_counter is not None else multiprocessing.Value('q', 0)
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True #headers and body are written separately, each answer would wait for the delayed ACK
+
+            def do_GET(self):
+                params = dict((key, values[0]) for key, values in parse_qs(urlparse(self.path).query, keep_blank_values=True).items())
+                with mock._request_counter.get_lock():
+                    mock._request_counter.value += 1
+                if mock.latency:
+                    time.sleep(mock.latency)
+                body = json.dumps(mock.answer(params)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.api_url = 'http://%s:%d/api.php' % (host, self.server.server_port)
+
+    @property
+    def requests(self):
+        return self._request_counter.value
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.api_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _page(self, page_ID, params):
+        page = self.wiki.pages[page_ID]
+        props = params.get('prop', '').split('|')
+        result = {'pageid': page_ID, 'ns': page['ns'], 'title': page['title']}
+
+        if 'info' in props:
+            result.update({'fullurl': self.wiki.url(page_ID), 'touched': '2026-01-01T00:00:00Z', 'lastrevid': page_ID})
+        if 'categories' in props:
+            result['categories'] = [{'ns': CATEGORY_NAMESPACE, 'title': self.wiki.pages[category]['title']} for category in page['categories']]
+        if 'links' in props:
+            result['links'] = [{'ns': 0, 'title': title} for title in page['links']]
+        if 'revisions' in props:
+            content = page['wikitext'] if page['ns'] == CATEGORY_NAMESPACE else page['text']
+            result['revisions'] = [{'revid': page_ID, 'slots': {'main': {'*': content}}, '*': content}]
+        if 'extracts' in props:
+            result['extract'] = page['text']
+        return result
+
+    def answer(self, params):
+        if params.get('action', 'query') != 'query':
+            return {'error': {'code': 'badvalue', 'info': 'Unsupported action'}}
+
+        if params.get('list') == 'search':
+            page_ID = self.wiki.find(params.get('srsearch', ''))
+            results = [{'ns': 0, 'title': self.wiki.pages[page_ID]['title']}] if page_ID is not None else []
+            return {'query': {'searchinfo': {}, 'search': results[:int(params.get('srlimit', 10))]}}
+
+        if params.get('generator') == 'categorymembers':
+            category = int(params['gcmpageid']) if 'gcmpageid' in params else self.wiki.find(params.get('gcmtitle', ''))
+            member_types = params.get('gcmtype', 'page|subcat|file').split('|')
+            members = [member for member in (self.wiki.pages[category]['members'] if category in self.wiki.pages else [])
+                       if ('subcat' if self.wiki.pages[member]['ns'] == CATEGORY_NAMESPACE else 'page') in member_types]
+            start = int(params.get('gcmcontinue', 0))
+            response = {'batchcomplete': '', 'query': {'pages': dict((str(member), self._page(member, params)) for member in members[start:start + MEMBERS_PER_RESPONSE])}}
+            if start + MEMBERS_PER_RESPONSE < len(members):
+                response['continue'] = {'gcmcontinue': str(start + MEMBERS_PER_RESPONSE), 'continue': 'gcmcontinue||'}
+            if not response['query']['pages']:
+                del response['query']
+            return response
+
+        pages = {}
+        query = {}
+        if 'pageids' in params:
+            for page_ID in params['pageids'].split('|'):
+                if int(page_ID) in self.wiki.pages:
+                    pages[page_ID] = self._page(int(page_ID), params)
+                else:
+                    pages[page_ID] = {'pageid': int(page_ID), 'missing': ''}
+        elif 'titles' in params:
+            missing = 0
+            for title in params['titles'].split('|'):
+                page_ID = self.wiki.find(title)
+                if page_ID is None:
+                    missing -= 1
+                    pages[str(missing)] = {'ns': 0, 'title': title, 'missing': ''}
+                    continue
+                if self.wiki.pages[page_ID]['title'] != title:
+                    query.setdefault('normalized', []).append({'from': title, 'to': self.wiki.pages[page_ID]['title']})
+                pages[str(page_ID)] = self._page(page_ID, params)
+        query['pages'] = pages
+        return {'batchcomplete': '', 'query': query}
+
+
+def _serve(wiki_options, latency, request_counter, url_queue):
+    mock = MockMediaWiki(SyntheticWiki(**wiki_options), latency, request_counter=request_counter)
+    url_queue.put(mock.api_url)
+    mock.server.serve_forever()
+
+
+class MockMediaWikiProcess(object):
+    '''
+    MockMediaWiki running in a child process, so that the memory and the CPU time of the server
+    are not counted in the measures of the process under test.
+    '''
+
+    def __init__(self, wiki_options, latency=0.0):
+        '''
+        :param wiki_options: keyword arguments of the SyntheticWiki served
+        :param latency: seconds waited before answering each request
+        '''
+        self._request_counter = multiprocessing.Value('q', 0)
+        self._url_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(wiki_options, latency, self._request_counter, self._url_queue), daemon=True)
+
+    @property
+    def requests(self):
+        return self._request_counter.value
+
+    def start(self):
+        self._process.start()
+        return self._url_queue.get()
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic wiki through a local stand-in of the MediaWiki API.')
+    parser.add_argument('--portals', type=int, default=2, help='number of category trees')
+    parser.add_argument('--fanout', type=int, default=3, help='subcategories of each category')
+    parser.add_argument('--depth', type=int, default=2, help='levels of subcategories')
+    parser.add_argument('--pages', type=int, default=5, help='pages of each category')
+    parser.add_argument('--cycles', type=int, default=0, help='subcategory edges pointing back to upper levels')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds waited before each answer')
+    parser.add_argument('--port', type=int, default=8080, help='port of the server')
+    args = parser.parse_args()
+
+    wiki = SyntheticWiki(args.portals, args.fanout, args.depth, args.pages, args.cycles)
+    mock = MockMediaWiki(wiki, args.latency, port=args.port)
+    print('Serving %d pages (portals: %s) at %s' % (len(wiki.pages), ', '.join(wiki.roots), mock.api_url))
+    mock.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
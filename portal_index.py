@@ -0,0 +1,231 @@
+'''
+Created on Oct 2026
+
+Persistent index of crawled portals, used to compare many portals against each other without
+crawling them again. For each portal (and subcategory depth) the index stores the set of its
+categories as a sorted array of integer IDs, and up to three sets of pages with their categories:
+- 'main': the main pages of the categories of the portal (common_link_crawler -m)
+- 'pages': the main pages and the pages of the categories (common_link_crawler -p)
+- 'links': the pages linked by the pages above (common_link_crawler -l)
+Category and page titles are interned in vocabularies shared by all the portals, so each page set
+is a sorted array of page IDs with the category IDs of each page in a flat array (with offsets).
+Overlaps between N portals are then computed with array operations, with no API calls: each
+portal is turned into a bitmap over the category vocabulary, and the page categories of the
+other portals are looked up in it.
+'''
+import os
+
+import numpy as np
+
+from common_link_crawler import normalize_category_title
+from compact_graph import node_attributes
+from dump_backend import _StringArray
+from wiki_crawler_desira import CategoryCrawler
+
+PAGE_SETS = ('main', 'pages', 'links')
+MODE_PAGE_SETS = {'-m': 'main', '-p': 'pages', '-l': 'links'}
+
+
+class PortalIndex(object):
+
+    def __init__(self, path=None, backend=None):
+        '''
+        :param path: file of the index (.npz), loaded if it exists; None for an index kept in memory
+        :param backend: wiki_backend.WikiBackend used to crawl the portals added to the index (None for the API)
+        '''
+        self.path = path
+        self.backend = backend
+        self.category_titles = []
+        self.page_titles = []
+        self.page_urls = []
+        self._category_IDs = {}
+        self._page_IDs = {}
+        # (portal, subcategory depth) -> {'categories': array, page set -> (page IDs, offsets, category IDs)}
+        self.portals = {}
+
+        if path is not None and os.path.isfile(path):
+            self._load(path)
+
+    def _category_ID(self, category_title):
+        category_title = normalize_category_title(category_title)
+        category_ID = self._category_IDs.get(category_title)
+        if category_ID is None:
+            category_ID = len(self.category_titles)
+            self._category_IDs[category_title] = category_ID
+            self.category_titles.append(category_title)
+        return category_ID
+
+    def _page_ID(self, page_title, page_url):
+        page_ID = self._page_IDs.get(page_title)
+        if page_ID is None:
+            page_ID = len(self.page_titles)
+            self._page_IDs[page_title] = page_ID
+            self.page_titles.append(page_title)
+            self.page_urls.append(page_url or '')
+        return page_ID
+
+    def _page_set(self, page_categories):
+        '''
+        Packs a dictionary page ID -> category IDs into sorted page IDs, offsets and flat category IDs.
+        '''
+        page_IDs = np.array(sorted(page_categories), dtype=np.int64)
+        lengths = [len(page_categories[page_ID]) for page_ID in page_IDs]
+        offsets = np.zeros(len(page_IDs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        category_IDs = np.fromiter((category_ID for page_ID in page_IDs for category_ID in sorted(page_categories[page_ID])),
+                                   dtype=np.int64, count=int(offsets[-1]))
+        return page_IDs, offsets, category_IDs
+
+    def _add_resolved_pages(self, page_categories, resolved_pages):
+        for page_title, page_url, categories in resolved_pages.values():
+            page_ID = self._page_ID(page_title, page_url)
+            page_categories.setdefault(page_ID, set()).update(self._category_ID(category) for category in categories)
+
+    def add_portal(self, portal, subcategory_depth, page_set='main'):
+        '''
+        Crawls the portal and adds its categories and the given page set to the index,
+        replacing what was stored for the portal at that depth.
+        '''
+        category_crawler = CategoryCrawler(portal, backend=self.backend)
+        category_crawler.search_and_store_graph(portal, cat_page_id='unknown', subcategory_depth=subcategory_depth, max_depth=10,
+                                                parent_node="root_node", include_pages=page_set != 'main', node_type='name')
+
+        entry = {}
+        categories = set()
+        main_page_titles = []
+        node_titles = []
+        page_categories = {}
+
+        for node, node_data in category_crawler.get_category_graph().nodes(data=True):
+            if node == 'root_node':
+                continue
+            attributes = node_attributes(node_data)
+            node_title = attributes.get('title', node)
+            if node_title.startswith('Category:'): #the main page of a category has (in most of the cases) its name
+                categories.add(self._category_ID(node_title))
+                main_page_titles.append(node_title[len('Category:'):])
+                node_titles.append(node_title[len('Category:'):])
+            else:
+                node_titles.append(node_title)
+                if page_set == 'pages':
+                    page_ID = self._page_ID(node_title, attributes.get('url'))
+                    page_categories.setdefault(page_ID, set()).update(self._category_ID(category) for category in attributes.get('categories', []))
+
+        entry['categories'] = np.array(sorted(categories), dtype=np.int64)
+
+        if page_set == 'links':
+            linked_titles = set()
+            for links in category_crawler.backend.search_links_by_titles(node_titles).values():
+                linked_titles.update(links)
+            self._add_resolved_pages(page_categories, category_crawler.backend.search_pages_by_titles(sorted(linked_titles)))
+        else:
+            # the pages of the categories already come with their categories from the crawl
+            self._add_resolved_pages(page_categories, category_crawler.backend.search_pages_by_titles(main_page_titles))
+
+        entry[page_set] = self._page_set(page_categories)
+
+        previous_entry = self.portals.get((portal, subcategory_depth))
+        if previous_entry is not None and np.array_equal(previous_entry['categories'], entry['categories']):
+            for other_set in PAGE_SETS:
+                if other_set in previous_entry and other_set not in entry:
+                    entry[other_set] = previous_entry[other_set]
+        self.portals[(portal, subcategory_depth)] = entry
+
+    def has_portal(self, portal, subcategory_depth, page_set='main'):
+        return page_set in self.portals.get((portal, subcategory_depth), {})
+
+    def _category_bitmap(self, portal_key):
+        bitmap = np.zeros(len(self.category_titles), dtype=bool)
+        bitmap[self.portals[portal_key]['categories']] = True
+        return bitmap
+
+    def _pages_in_categories(self, portal_key, page_set, category_bitmap):
+        '''
+        Returns the sorted IDs of the pages of the page set of the portal that have a category in the bitmap.
+        '''
+        page_IDs, offsets, category_IDs = self.portals[portal_key][page_set]
+        owners = np.repeat(np.arange(len(page_IDs)), np.diff(offsets))
+        return np.unique(page_IDs[owners[category_bitmap[category_IDs]]])
+
+    def common_pages(self, portal_key_A, portal_key_B, page_set='main'):
+        '''
+        Pages from any of the two portals that have a category in common with the other portal,
+        as get_common_pages and get_common_linked_pages compute them on two live crawls.
+        :param portal_key_A: (portal, subcategory depth) of the first portal
+        :param portal_key_B: (portal, subcategory depth) of the second portal
+        :return: sorted array of page IDs; titles and URLs are in page_titles and page_urls
+        '''
+        return np.union1d(self._pages_in_categories(portal_key_A, page_set, self._category_bitmap(portal_key_B)),
+                          self._pages_in_categories(portal_key_B, page_set, self._category_bitmap(portal_key_A)))
+
+    def overlap_matrix(self, portal_keys, page_set='main'):
+        '''
+        Returns the N x N matrix with the number of common pages of each pair of portals.
+        The diagonal holds the number of pages in the page set of each portal.
+        '''
+        bitmaps = [self._category_bitmap(portal_key) for portal_key in portal_keys]
+        matrix = np.zeros((len(portal_keys), len(portal_keys)), dtype=np.int64)
+
+        for i, portal_key_A in enumerate(portal_keys):
+            matrix[i, i] = len(self.portals[portal_key_A][page_set][0])
+            for j in range(i + 1, len(portal_keys)):
+                portal_key_B = portal_keys[j]
+                common = np.union1d(self._pages_in_categories(portal_key_A, page_set, bitmaps[j]),
+                                    self._pages_in_categories(portal_key_B, page_set, bitmaps[i]))
+                matrix[i, j] = matrix[j, i] = len(common)
+
+        return matrix
+
+    def category_overlap_matrix(self, portal_keys):
+        '''
+        Returns the N x N matrix with the number of categories shared by each pair of portals.
+        '''
+        matrix = np.zeros((len(portal_keys), len(portal_keys)), dtype=np.int64)
+        for i, portal_key_A in enumerate(portal_keys):
+            for j, portal_key_B in enumerate(portal_keys):
+                if j >= i:
+                    matrix[i, j] = matrix[j, i] = len(np.intersect1d(self.portals[portal_key_A]['categories'],
+                                                                     self.portals[portal_key_B]['categories'], assume_unique=True))
+        return matrix
+
+    def save(self, path=None):
+        '''
+        Saves the index in a compressed .npz file. The file is written to a temporary file first,
+        so that a crash never leaves a truncated index.
+        '''
+        path = path or self.path
+        arrays = {'depths': np.array([subcategory_depth for _, subcategory_depth in self.portals], dtype=np.int64)}
+        # the vocabularies are stored as UTF-8 buffers with offsets, as the string tables of dump_backend
+        for name, strings in (('category_titles', self.category_titles), ('page_titles', self.page_titles),
+                              ('page_urls', self.page_urls), ('portals', [portal for portal, _ in self.portals])):
+            string_array = _StringArray.from_list(strings)
+            arrays[name], arrays[name + '_offsets'] = string_array.buffer, string_array.offsets
+        for n, entry in enumerate(self.portals.values()):
+            arrays['p%d_categories' % n] = entry['categories']
+            for page_set in PAGE_SETS:
+                if page_set in entry:
+                    arrays['p%d_%s_pages' % (n, page_set)], arrays['p%d_%s_offsets' % (n, page_set)], arrays['p%d_%s_categories' % (n, page_set)] = entry[page_set]
+
+        with open(path + '.tmp', 'wb') as index_file:
+            np.savez_compressed(index_file, **arrays)
+        os.replace(path + '.tmp', path)
+
+    def _load(self, path):
+        with np.load(path) as arrays:
+            def strings(name):
+                if name + '_offsets' not in arrays.files: #index saved with fixed-width string arrays
+                    return arrays[name].tolist()
+                return list(_StringArray(arrays[name], arrays[name + '_offsets']))
+
+            self.category_titles = strings('category_titles')
+            self.page_titles = strings('page_titles')
+            self.page_urls = strings('page_urls')
+            for n, (portal, subcategory_depth) in enumerate(zip(strings('portals'), arrays['depths'].tolist())):
+                entry = {'categories': arrays['p%d_categories' % n]}
+                for page_set in PAGE_SETS:
+                    if 'p%d_%s_pages' % (n, page_set) in arrays.files:
+                        entry[page_set] = tuple(arrays['p%d_%s_%s' % (n, page_set, part)] for part in ('pages', 'offsets', 'categories'))
+                self.portals[(portal, subcategory_depth)] = entry
+
+        self._category_IDs = {category_title: n for n, category_title in enumerate(self.category_titles)}
+        self._page_IDs = {page_title: n for n, page_title in enumerate(self.page_titles)}
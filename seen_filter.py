@@ -0,0 +1,142 @@
+'''
+Created on Oct 2026
+
+Compact filters of the keys (page titles, links) already seen by the streaming overlap of
+common_link_crawler.py, so that each result is written once without keeping the results in memory.
+- SeenSet keeps a 64-bit digest of each key in an open-addressing table of 8-byte slots, at most half
+  full: it is exact in practice (collisions are negligible below billions of keys), and takes 16 to 32
+  bytes per key, against about 75 of a digest in a Python set, but it grows with the keys.
+- BloomFilter keeps a fixed bit array sized for an expected number of keys and a false positive
+  rate: its memory does not grow with the keys, but a false positive makes a new key look seen,
+  so a few results may be missing (with the probability given by error_rate).
+Both have the same interface: add(key) returns True if the key was not seen before.
+'''
+import hashlib
+import math
+from array import array
+
+SEEN_FILTERS = ('set', 'bloom')
+DEFAULT_CAPACITY = 10000000 #keys expected by a Bloom filter, about 36MB with the default error rate
+DEFAULT_ERROR_RATE = 1e-6 #false positive rate of a Bloom filter at its capacity
+INITIAL_SLOTS = 1024 #slots of a new SeenSet, doubled when it is half full
+
+
+def _digest(key, size):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=size).digest()
+
+
+def _slot_digest(key):
+    # 0 marks the empty slots, so the (unlikely) digest 0 is stored as 1
+    return int.from_bytes(_digest(key, 8), 'little') or 1
+
+
+class SeenSet(object):
+
+    def __init__(self):
+        self._slots = array('Q', [0]) * INITIAL_SLOTS
+        self._keys = 0
+
+    def _find(self, digest):
+        '''
+        :return: index of the slot holding the digest, or of the empty slot where it goes (linear probing)
+        '''
+        slots = self._slots
+        mask = len(slots) - 1
+        i = digest & mask
+        while slots[i] and slots[i] != digest:
+            i = (i + 1) & mask
+        return i
+
+    def _grow(self):
+        old_slots = self._slots
+        self._slots = array('Q', [0]) * (2 * len(old_slots))
+        for digest in old_slots:
+            if digest:
+                self._slots[self._find(digest)] = digest
+
+    def add(self, key):
+        '''
+        :return: True if the key was not seen before
+        '''
+        digest = _slot_digest(key)
+        i = self._find(digest)
+        if self._slots[i]:
+            return False
+        self._slots[i] = digest
+        self._keys += 1
+        if 2 * self._keys > len(self._slots):
+            self._grow()
+        return True
+
+    def __contains__(self, key):
+        return bool(self._slots[self._find(_slot_digest(key))])
+
+    def __len__(self):
+        return self._keys
+
+
+class BloomFilter(object):
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        '''
+        :param capacity: number of keys expected, beyond which the false positive rate grows over error_rate
+        :param error_rate: false positive rate at the capacity
+        '''
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))) #bits
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._keys = 0
+
+    def _positions(self, key):
+        # double hashing: the positions are h1 + i * h2, from the two halves of a 128-bit digest
+        digest = _digest(key, 16)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        '''
+        :return: True if the key was not seen before (False also for the false positives)
+        '''
+        bits = self._bits
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        self._keys += new
+        return new
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        # keys added as new, an approximation of the distinct keys
+        return self._keys
+
+
+def make_seen_filter(kind='set', capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+    '''
+    :param kind: 'set' for a SeenSet, 'bloom' for a BloomFilter with the given capacity and error rate
+    '''
+    if kind == 'bloom':
+        return BloomFilter(capacity, error_rate)
+    if kind == 'set':
+        return SeenSet()
+    raise ValueError('unknown seen filter %s, expected one of %s' % (kind, ', '.join(SEEN_FILTERS)))
+
+
+def add_seen_filter_arguments(parser):
+    '''
+    Adds the command line options of the seen filter to an argparse parser.
+    '''
+    parser.add_argument('--seen-filter', default='set', choices=SEEN_FILTERS,
+                        help='deduplication of the streamed results: exact digest set, or fixed-memory Bloom filter')
+    parser.add_argument('--seen-capacity', type=int, default=DEFAULT_CAPACITY, help='keys expected by the Bloom filter')
+    parser.add_argument('--seen-error-rate', type=float, default=DEFAULT_ERROR_RATE, help='false positive rate of the Bloom filter')
+
+
+def seen_filter_from_args(args):
+    return make_seen_filter(args.seen_filter, args.seen_capacity, args.seen_error_rate)
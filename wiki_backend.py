@@ -0,0 +1,92 @@
+'''
+Created on Oct 2026
+
+Backends answering the queries of CategoryCrawler and of the common_link_crawler.py helpers:
+category members, page URLs and info, page categories and page links. WikiBackend is the
+interface; the MediaWiki API implementation is wiki_crawler_desira.ApiBackend, the default,
+and dump_backend.DumpBackend answers the same queries offline from the SQL dumps of a wiki.
+dump_backend, with numpy, is imported only when a dump is used (--dump).
+'''
+
+
+class PageNotFound(Exception):
+    '''
+    Raised by get_page when a page does not exist (or is ambiguous, for the API backend).
+    '''
+    pass
+
+
+class WikiBackend(object):
+    '''
+    Queries used by the crawlers. The methods mirror the _wiki_* helpers of wiki_crawler_desira.py,
+    and return the same structures.
+    '''
+
+    def iter_category_members(self, cat_title, cat_page_id='unknown', member_types='page|subcat'):
+        '''
+        :return: generator of dictionaries with pageid, ns, title, fullurl, touched and categories of each member
+        '''
+        raise NotImplementedError
+
+    def search_cat_ID_by_name(self, cat_name):
+        '''
+        :return: page ID of the category, -1 if it does not exist
+        '''
+        raise NotImplementedError
+
+    def search_url_by_ID(self, page_ID):
+        raise NotImplementedError
+
+    def search_info_by_IDs(self, page_IDs):
+        '''
+        :return: dictionary page ID -> info of the page (title, fullurl, touched); missing pages are not included
+        '''
+        raise NotImplementedError
+
+    def search_pages_by_titles(self, titles, stop=None):
+        '''
+        :param stop: function called between the requests of a backend that sends several, that returns True
+        to stop the search early (the pages being received may miss some categories)
+        :return: dictionary title -> (canonical title, URL, list of category names without the 'Category:' prefix)
+        '''
+        raise NotImplementedError
+
+    def search_links_by_titles(self, titles, stop=None):
+        '''
+        :param stop: function called between the requests of a backend that sends several, that returns True
+        to stop the search early (the pages being received may miss some links)
+        :return: dictionary title -> list of linked article titles
+        '''
+        raise NotImplementedError
+
+    def search_main_pages_by_IDs(self, cat_IDs):
+        '''
+        :return: dictionary category ID -> URL of the main page of the category, or None if not found
+        '''
+        raise NotImplementedError
+
+    def get_page(self, title):
+        '''
+        :return: page object with title, url, categories and links, as wikipedia.page
+        :raise PageNotFound: if the page does not exist
+        '''
+        raise NotImplementedError
+
+
+def add_backend_arguments(parser):
+    '''
+    Adds the command line options of the backend to an argparse parser.
+    '''
+    parser.add_argument('--dump', default=None, help='store directory built by dump_backend.py, or JSON fixture, used instead of the API')
+
+
+def backend_from_args(args):
+    '''
+    Returns the DumpBackend configured by the options of add_backend_arguments, or None to use the API.
+    '''
+    if args.dump is None:
+        return None
+    from dump_backend import DumpBackend
+    if args.dump.endswith('.json'):
+        return DumpBackend.from_fixture(args.dump)
+    return DumpBackend.load(args.dump)
@@ -0,0 +1,141 @@
+'''
+Created on Oct 2026
+
+Persistent on-disk cache of the MediaWiki API responses. Responses are stored in a SQLite
+file, addressed by a hash of the API URL and of the request parameters, so that repeated
+runs on overlapping portals do not query the server again. Entries expire after a TTL,
+and the least recently used ones are evicted when the cache grows beyond its size bound.
+In offline mode a missing entry raises CacheMissError instead of reaching the network,
+which allows to run against a recorded cache.
+'''
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_TTL = 7 * 24 * 3600 #seconds after which a cached response is fetched again
+DEFAULT_MAX_ENTRIES = 1000000 #maximum number of responses kept in the cache
+EVICTION_FRACTION = 0.1 #fraction of the entries removed when the cache is full
+IGNORED_PARAMS = ('maxlag',) #parameters that do not change the content of a response
+
+
+class CacheMissError(Exception):
+    '''
+    Raised in offline mode when a response is not in the cache.
+    '''
+    pass
+
+
+class ResponseCache(object):
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, offline=False, read_only=False):
+        '''
+        :param path: path of the SQLite file
+        :param ttl: seconds after which an entry expires (None: entries never expire)
+        :param max_entries: maximum number of entries, the least recently used are evicted beyond it
+        :param offline: if True, a missing entry raises CacheMissError instead of querying the API
+        :param read_only: if True, the cache file is never modified
+        '''
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.offline = offline
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        if read_only:
+            self._connection = sqlite3.connect('file:%s?mode=ro' % path, uri=True, check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                                     '(key TEXT PRIMARY KEY, response BLOB, created REAL, accessed REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self._connection.commit()
+        self._entries = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def key(api_url, params):
+        '''
+        Content address of a request: hash of the API URL and of the sorted parameters.
+        '''
+        request = [api_url, sorted((str(k), str(v)) for k, v in params.items() if k not in IGNORED_PARAMS)]
+        return hashlib.sha256(json.dumps(request).encode('utf-8')).hexdigest()
+
+    def get(self, api_url, params):
+        '''
+        Returns the cached response for the request, or None if missing or expired.
+        '''
+        key = self.key(api_url, params)
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl is not None and not self.offline and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                self._connection.commit()
+
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, api_url, params, response):
+        '''
+        Stores the response of the request, evicting the least recently used entries if the cache is full.
+        '''
+        if self.read_only:
+            return
+        key = self.key(api_url, params)
+        now = time.time()
+        blob = zlib.compress(json.dumps(response).encode('utf-8'))
+
+        with self._lock:
+            inserted = self._connection.execute('INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)', (key, blob, now, now)).rowcount
+            if inserted:
+                self._entries += 1
+            else:
+                self._connection.execute('UPDATE responses SET response = ?, created = ?, accessed = ? WHERE key = ?', (blob, now, now, key))
+
+            if self.max_entries is not None and self._entries > self.max_entries:
+                evicted = max(1, int(self.max_entries * EVICTION_FRACTION))
+                self._connection.execute('DELETE FROM responses WHERE key IN '
+                                         '(SELECT key FROM responses ORDER BY accessed LIMIT ?)', (evicted,))
+                self._entries = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM responses')
+            self._connection.commit()
+            self._entries = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def add_cache_arguments(parser):
+    '''
+    Adds the command line options of the cache to an argparse parser.
+    '''
+    parser.add_argument('--cache', default=None, help='path of the SQLite file used to cache the API responses')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL, help='seconds after which a cached response is fetched again')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES, help='maximum number of cached responses')
+    parser.add_argument('--offline', action='store_true', help='answer only from the cache, without querying the API')
+
+
+def cache_from_args(args):
+    '''
+    Returns the ResponseCache configured by the options of add_cache_arguments, or None if no cache was requested.
+    '''
+    if args.cache is None:
+        if args.offline:
+            raise ValueError('--offline requires --cache')
+        return None
+    return ResponseCache(args.cache, ttl=args.cache_ttl, max_entries=args.cache_size, offline=args.offline)
@@ -0,0 +1,224 @@
+'''
+Created on Oct 2026
+
+Shared HTTP client for the MediaWiki API. All the scripts that query the API
+(wiki_crawler_desira.py, compute_readability.py) go through this module, so that
+connections are pooled and kept alive across requests, responses are gzip
+compressed, and transient failures are retried instead of aborting a crawl.
+Responses can be stored in a persistent wiki_cache.ResponseCache, and the requests of the
+wikipedia library can be routed through the same clients with install_wikipedia_hook.
+Every request is recorded in crawl_stats.stats (count, latency, bytes, retries, cache hits per action).
+requests and the wikipedia library are imported on first use, so that importing the module is cheap.
+'''
+import threading
+import time
+
+from crawl_stats import stats
+from wiki_cache import CacheMissError
+
+POOL_SIZE = 10 #number of keep-alive connections kept open towards the API host
+MAX_RETRIES = 5 #number of times a request is retried on 429/5xx, connection errors and maxlag
+BACKOFF_FACTOR = 0.5 #wait BACKOFF_FACTOR * 2^attempt seconds between retries
+MAX_BACKOFF = 60 #upper bound for a single wait, in seconds
+MAXLAG = 5 #seconds of replication lag after which the server asks us to back off (None to disable)
+TIMEOUT = 30 #seconds before giving up on a single request
+MAX_RATE = None #maximum number of requests per second sent to the API host (None for no cap)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+USER_AGENT = 'DESIRA-WikiAnalysis (https://github.com/alessioferrari/DESIRA-WikiAnalysis-Repo)'
+
+
+def _endpoint(params):
+    '''
+    Name under which a request is recorded in the statistics, e.g. 'query:categorymembers' or 'parse'.
+    '''
+    action = params.get('action', 'query')
+    if action != 'query':
+        return action
+    module = params.get('generator') or params.get('list') or params.get('prop') or params.get('meta')
+    return 'query:' + module if module else 'query'
+
+
+class WikiApiError(Exception):
+    '''
+    Raised for an error response of the API (e.g. maxlag once the retries are exhausted),
+    which must not be taken for an empty result.
+    '''
+
+    def __init__(self, error):
+        self.code = error.get('code')
+        self.info = error.get('info')
+        super(WikiApiError, self).__init__('%s: %s' % (self.code, self.info))
+
+
+class WikiClient(object):
+
+    def __init__(self, api_url, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 maxlag=MAXLAG, timeout=TIMEOUT, max_rate=MAX_RATE, cache=None):
+        self.api_url = api_url
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.maxlag = maxlag
+        self.timeout = timeout
+        self.max_rate = max_rate
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0.0
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate'})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _backoff(self, attempt, retry_after=None):
+        '''
+        Sleep before the next attempt. The Retry-After header sent with 429/503 and
+        maxlag errors takes precedence over the exponential backoff.
+        '''
+        try:
+            wait = float(retry_after)
+        except (TypeError, ValueError):
+            wait = self.backoff_factor * (2 ** attempt)
+        time.sleep(min(wait, MAX_BACKOFF))
+
+    def _wait_for_rate_slot(self):
+        '''
+        Blocks until the next request can be sent without exceeding max_rate.
+        The client is shared by all the threads that query the same host, so this caps the host rate.
+        '''
+        if not self.max_rate:
+            return
+        with self._rate_lock:
+            now = time.time()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + 1.0 / self.max_rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def request(self, params):
+        '''
+        Make a request to the MediaWiki API using the given search parameters.
+        Returns a parsed dict of the JSON response.
+        :param params: API parameters; 'format' is forced to json and 'action' defaults to 'query'
+        '''
+        params = dict(params)
+        params['format'] = 'json'
+        if not 'action' in params:
+            params['action'] = 'query'
+        if self.maxlag is not None and not 'maxlag' in params:
+            params['maxlag'] = self.maxlag
+
+        if self.cache is not None:
+            response = self.cache.get(self.api_url, params)
+            if response is not None:
+                stats.record_request(_endpoint(params), 0.0, cached=True)
+                return response
+            if self.cache.offline:
+                raise CacheMissError('%s %s' % (self.api_url, params))
+
+        response = self._send(params)
+
+        if self.cache is not None and not 'error' in response:
+            self.cache.put(self.api_url, params, response)
+
+        return response
+
+    def _send(self, params):
+        '''
+        Sends the request to the API, retrying on transient errors.
+        '''
+        import requests
+
+        start = time.time()
+        attempt = 0
+        while True:
+            self._wait_for_rate_slot()
+            try:
+                r = self.session.get(self.api_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    stats.record_request(_endpoint(params), time.time() - start, retries=attempt, error=True)
+                    raise
+                self._backoff(attempt)
+                attempt += 1
+                continue
+
+            if r.status_code in RETRY_STATUS_CODES:
+                if attempt >= self.max_retries:
+                    stats.record_request(_endpoint(params), time.time() - start, int(r.headers.get('Content-Length', len(r.content))), retries=attempt, error=True)
+                    r.raise_for_status()
+                self._backoff(attempt, r.headers.get('Retry-After'))
+                attempt += 1
+                continue
+
+            response = r.json()
+
+            # the server answers 200 with an error code when the replication lag exceeds maxlag
+            if response.get('error', {}).get('code') == 'maxlag':
+                if attempt >= self.max_retries:
+                    stats.record_request(_endpoint(params), time.time() - start, int(r.headers.get('Content-Length', len(r.content))), retries=attempt, error=True)
+                    raise WikiApiError(response['error'])
+                self._backoff(attempt, r.headers.get('Retry-After'))
+                attempt += 1
+                continue
+
+            stats.record_request(_endpoint(params), time.time() - start, int(r.headers.get('Content-Length', len(r.content))), retries=attempt, error='error' in response)
+            return response
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_client_options = {}
+_wikipedia_hooked = False
+
+
+def configure(**options):
+    '''
+    Set the options (pool_size, max_retries, backoff_factor, maxlag, timeout, max_rate, cache) used for
+    the clients created from now on. Clients already created are discarded.
+    '''
+    with _clients_lock:
+        _client_options.update(options)
+        _clients.clear()
+
+
+def get_client(api_url):
+    '''
+    Returns the shared client for the given API URL, creating it on first use.
+    '''
+    with _clients_lock:
+        client = _clients.get(api_url)
+        if client is None:
+            client = WikiClient(api_url, **_client_options)
+            _clients[api_url] = client
+        return client
+
+
+def install_wikipedia_hook():
+    '''
+    Routes the requests made by the wikipedia library (wikipedia.page, .links, .categories,
+    .content, ...) through the shared client of its API_URL, so that they also use the
+    pooled session, the retries and the response cache.
+    '''
+    global _wikipedia_hooked
+    import wikipedia.wikipedia as wikipedia_module
+
+    def _wiki_request(params):
+        return get_client(wikipedia_module.API_URL).request(params)
+
+    wikipedia_module._wiki_request = _wiki_request
+    _wikipedia_hooked = True
+
+
+def get_wikipedia():
+    '''
+    Returns the wikipedia library, importing it (with BeautifulSoup) on first use and routing its
+    requests through the shared clients with install_wikipedia_hook.
+    '''
+    import wikipedia
+    if not _wikipedia_hooked:
+        install_wikipedia_hook()
+    return wikipedia
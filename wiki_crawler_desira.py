@@ -5,37 +5,46 @@ Created on Sept 2019
 '''
 from __future__ import division
 
+import argparse
+import logging
 import os
-import sys
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-import wikipedia
-from wikipedia.exceptions import PageError, DisambiguationError
-import networkx as nx
 import re
 
+from compact_graph import CompactGraph, GRAPH_FORMATS, export_graph
+import crawl_stats
+from crawl_stats import stats
+import wiki_backend
+import wiki_cache
+import wiki_client
 
 #API_URL = 'http://en.wikipedia.org/w/api.php' #Wikipedia web
 API_URL = 'http://146.48.81.210/mediawiki-1.33.1/api.php' #Wikipedia Server WNLAB
 #API_URL = 'http://192.168.64.2/wiki/api.php' #Wikipedia local
-SEARCH_MAIN_ARTICLE_WIN = 1000 #window of chars to search in the content of a category page to identify whether a main article exists
-MAIN_ARTICLE_STRING = u'The main article for this <a href="/wiki/Help:Categories" title="Help:Categories">category</a> is <b><a href='
-WIKI_PAGE_PREFIX = 'https://en.wikipedia.org/'
+MAIN_ARTICLE_TEMPLATE = re.compile(r'\{\{\s*(?:Template:)?\s*(?:cat\s*main|category\s+main(?:\s+article)?|main\s+cat(?:egory)?(?:\s+article)?)\s*(\|[^{}]*)?\}\}', re.IGNORECASE) #{{Cat main}} and its redirects
+MAX_IDS_PER_QUERY = 50 #maximum number of pageids/titles accepted by the API in a single query
+CATEGORY_NAMESPACE = 14
+DEFAULT_WORKERS = 8 #number of categories fetched concurrently by search_and_store_graph_concurrent
+CHECKPOINT_EVERY = 100 #categories stored between two checkpoints of the crawl
+
+logger = logging.getLogger(__name__)
 
 
 def _wiki_request(params):
     '''
     Make a request to the Wikipedia API using the given search parameters.
     Returns a parsed dict of the JSON response.
+    The request goes through the pooled client in wiki_client, which retries on transient errors.
+    An error response raises wiki_client.WikiApiError, so that it is never taken for an empty
+    result (and stored in the graph or in the checkpoint of a crawl).
     '''
 
-    params['format'] = 'json'
-    if not 'action' in params:
-        params['action'] = 'query'
-
-    r = requests.get(API_URL, params=params)
-
-    return r.json()
+    response = wiki_client.get_client(API_URL).request(params)
+    if 'error' in response:
+        raise wiki_client.WikiApiError(response['error'])
+    return response
 
 def _wiki_search_url_by_ID(page_ID):
 
@@ -47,6 +56,197 @@ def _wiki_search_url_by_ID(page_ID):
 
     return _wiki_request(search_page_ID)['query']['pages'][str(page_ID)]['fullurl']
 
+def _wiki_search_info_by_IDs(page_IDs):
+    '''
+    Returns the info (title, URL, touched timestamp, last revision, ...) of all the given pages,
+    MAX_IDS_PER_QUERY pages per request.
+    :param page_IDs: iterable of page IDs
+    :return: dictionary page ID -> info of the page (missing pages are not included)
+    '''
+    page_IDs = list(dict.fromkeys(page_IDs))
+    pages_info = {}
+
+    for start in range(0, len(page_IDs), MAX_IDS_PER_QUERY):
+        chunk = page_IDs[start:start + MAX_IDS_PER_QUERY]
+        search_page_IDs = {
+            'prop': 'info',
+            'pageids': '|'.join(str(page_ID) for page_ID in chunk),
+            'inprop': 'url'
+        }
+
+        pages = _wiki_request(search_page_IDs)['query']['pages']
+        for page_ID in chunk:
+            page = pages.get(str(page_ID), {})
+            if not 'missing' in page and 'title' in page:
+                pages_info[page_ID] = page
+
+    return pages_info
+
+def _wiki_iter_continued_query(params):
+    '''
+    Runs a generator query following the API continuation, and yields the pages of each
+    batch once all their properties have been returned (i.e., when the batch is complete).
+    Properties returned in pieces across responses (e.g., categories) are merged.
+    '''
+    params = dict(params)
+    batch = {}
+
+    while True:
+        response = _wiki_request(params)
+
+        for page_ID, page in response.get('query', {}).get('pages', {}).items():
+            merged_page = batch.setdefault(page_ID, {})
+            for key, value in page.items():
+                if isinstance(value, list):
+                    merged_page.setdefault(key, []).extend(value)
+                else:
+                    merged_page[key] = value
+
+        if 'batchcomplete' in response or 'continue' not in response:
+            for page in batch.values():
+                yield page
+            batch = {}
+
+        if 'continue' not in response:
+            break
+        params.update(response['continue'])
+
+def _wiki_iter_category_members(cat_title, cat_page_id='unknown', member_types='page|subcat'):
+    '''
+    Streams all the members of a category, following the continuation, so that large
+    categories are not truncated. URL and categories of each member are returned in the same
+    response, through generator=categorymembers with prop=info|categories.
+    :param cat_title: title of the category, used if cat_page_id is unknown
+    :param cat_page_id: ID of the category page
+    :param member_types: members to list, 'page', 'subcat' or 'page|subcat'
+    :return: generator of dictionaries with pageid, ns, title, fullurl and categories of each member
+    '''
+    search_params_members = {
+        'generator': 'categorymembers',
+        'gcmtype': member_types,
+        'gcmlimit': 'max',
+        'prop': 'info|categories',
+        'inprop': 'url',
+        'cllimit': 'max'}
+
+    if (cat_page_id=='unknown'):
+        search_params_members['gcmtitle'] = cat_title
+    else:
+        search_params_members['gcmpageid'] = cat_page_id
+
+    for member in _wiki_iter_continued_query(search_params_members):
+        member['categories'] = [cat['title'] for cat in member.get('categories', [])]
+        yield member
+
+def _wiki_search_pages_by_titles(titles, stop=None):
+    '''
+    Bulk resolver of pages by title: returns canonical title, URL and categories of all the given
+    pages, MAX_IDS_PER_QUERY titles per query (prop=categories|info with redirects), following the
+    continuation of the categories. Missing pages and disambiguation pages are not included, as
+    wikipedia.page would raise PageError or DisambiguationError for them.
+    :param titles: iterable of page titles
+    :param stop: function called before each request after the first one, that returns True to stop
+    the search: the pages of the interrupted query come with the categories received so far
+    :return: dictionary title -> (canonical title, URL, list of category names without the 'Category:' prefix)
+    '''
+    titles = list(dict.fromkeys(titles))
+    resolved_pages = {}
+
+    for start in range(0, len(titles), MAX_IDS_PER_QUERY):
+        if start and stop is not None and stop():
+            break
+        chunk = titles[start:start + MAX_IDS_PER_QUERY]
+        search_titles = {
+            'titles': '|'.join(chunk),
+            'prop': 'categories|info|pageprops',
+            'inprop': 'url',
+            'ppprop': 'disambiguation',
+            'redirects': '',
+            'cllimit': 'max'
+        }
+
+        pages = {}
+        renamed = {}
+        while True:
+            response = _wiki_request(search_titles)
+            query = response.get('query', {})
+
+            for renaming in query.get('normalized', []) + query.get('redirects', []):
+                renamed[renaming['from']] = renaming['to']
+
+            for page in query.get('pages', {}).values():
+                merged_page = pages.setdefault(page['title'], {'categories': []})
+                merged_page['categories'].extend(page.pop('categories', []))
+                merged_page.update(page)
+
+            if 'continue' not in response or (stop is not None and stop()):
+                break
+            search_titles.update(response['continue'])
+
+        for title in chunk:
+            canonical_title = renamed.get(title, title)
+            canonical_title = renamed.get(canonical_title, canonical_title) #normalized title that is also a redirect
+            page = pages.get(canonical_title)
+            if page is None or 'missing' in page or 'invalid' in page or 'disambiguation' in page.get('pageprops', {}):
+                continue
+            categories = [re.sub(r'^Category:', '', cat['title']) for cat in page['categories']]
+            resolved_pages[title] = (page['title'], page['fullurl'], categories)
+
+    return resolved_pages
+
+def _wiki_search_links_by_titles(titles, stop=None):
+    '''
+    Bulk version of wikipedia.page(title).links: returns the titles of the articles linked by each
+    of the given pages, MAX_IDS_PER_QUERY titles per query (prop=links with redirects), following
+    the continuation of the links. Missing pages are not included.
+    :param titles: iterable of page titles
+    :param stop: function called before each request after the first one, that returns True to stop
+    the search: the pages of the interrupted query come with the links received so far
+    :return: dictionary title -> list of linked article titles
+    '''
+    titles = list(dict.fromkeys(titles))
+    page_links = {}
+
+    for start in range(0, len(titles), MAX_IDS_PER_QUERY):
+        if start and stop is not None and stop():
+            break
+        chunk = titles[start:start + MAX_IDS_PER_QUERY]
+        search_links = {
+            'titles': '|'.join(chunk),
+            'prop': 'links',
+            'plnamespace': 0,
+            'pllimit': 'max',
+            'redirects': ''
+        }
+
+        pages = {}
+        renamed = {}
+        while True:
+            response = _wiki_request(search_links)
+            query = response.get('query', {})
+
+            for renaming in query.get('normalized', []) + query.get('redirects', []):
+                renamed[renaming['from']] = renaming['to']
+
+            for page in query.get('pages', {}).values():
+                merged_page = pages.setdefault(page['title'], {'links': []})
+                merged_page['links'].extend(page.pop('links', []))
+                merged_page.update(page)
+
+            if 'continue' not in response or (stop is not None and stop()):
+                break
+            search_links.update(response['continue'])
+
+        for title in chunk:
+            canonical_title = renamed.get(title, title)
+            canonical_title = renamed.get(canonical_title, canonical_title)
+            page = pages.get(canonical_title)
+            if page is None or 'missing' in page or 'invalid' in page:
+                continue
+            page_links[title] = [link['title'] for link in page['links']]
+
+    return page_links
+
 def _wiki_search_cat_ID_by_name(cat_name):
     # Example: https://www.mediawiki.org/w/api.php?action=query&titles=Category:Artificial%20intelligence
 
@@ -57,48 +257,114 @@ def _wiki_search_cat_ID_by_name(cat_name):
     #This searches the first element in the returned json dictionary
     return next(iter(_wiki_request(search_cat_ID)['query']['pages']))
 
-#This funciton search the URL of the main wikipedia page of a certain category
-#by inspecting the content of the category page
-def _wiki_search_main_page_for_cat(cat_ID):
+def _main_article_title(cat_title, wikitext):
+    '''
+    Returns the title of the main article of a category: the first argument of its {{Cat main}} template,
+    or the name of the category, which is (in most of the cases) also the title of its main article.
+    '''
+    template = MAIN_ARTICLE_TEMPLATE.search(wikitext or '')
+    if template is not None and template.group(1):
+        arguments = [argument.strip() for argument in template.group(1).split('|')[1:] if not '=' in argument]
+        if arguments and arguments[0]:
+            return arguments[0].split('#')[0].strip()
+    return re.sub(r'^Category:', '', cat_title)
+
+def _wiki_search_main_pages_for_cats(cat_IDs):
+    '''
+    Batched resolver of the main articles of categories: the wikitext of MAX_IDS_PER_QUERY categories
+    is read per request (prop=revisions) and searched for the {{Cat main}} template, then the main
+    articles are resolved in bulk with _wiki_search_pages_by_titles. Categories without the template
+    get the article with their name, as wikipedia.page would find it.
+    :param cat_IDs: iterable of page IDs of categories
+    :return: dictionary category ID -> URL of the main page, or None if not found
+    '''
+    cat_IDs = list(dict.fromkeys(int(cat_ID) for cat_ID in cat_IDs))
+    main_titles = {}
+
+    for start in range(0, len(cat_IDs), MAX_IDS_PER_QUERY):
+        search_cat_content = {
+            'pageids': '|'.join(str(cat_ID) for cat_ID in cat_IDs[start:start + MAX_IDS_PER_QUERY]),
+            'prop': 'revisions',
+            'rvprop': 'content',
+            'rvslots': 'main'
+        }
+        for page in _wiki_iter_continued_query(search_cat_content):
+            if 'missing' in page or not 'revisions' in page:
+                continue
+            revision = page['revisions'][0]
+            wikitext = revision.get('slots', {}).get('main', revision).get('*', '')
+            main_titles[page['pageid']] = _main_article_title(page['title'], wikitext)
+
+    main_pages = _wiki_search_pages_by_titles(main_titles.values())
+    return dict((cat_ID, main_pages[main_titles[cat_ID]][1] if main_titles.get(cat_ID) in main_pages else None) for cat_ID in cat_IDs)
+
+class ApiBackend(wiki_backend.WikiBackend):
+    '''
+    Backend of the crawlers that queries the MediaWiki API at API_URL (see wiki_backend.py).
+    '''
 
-    params_cat_content = {
-        'action': 'parse',
-        'pageid': cat_ID,
-        'prop': 'text'
-    }
+    def iter_category_members(self, cat_title, cat_page_id='unknown', member_types='page|subcat'):
+        return _wiki_iter_category_members(cat_title, cat_page_id, member_types)
 
-    cat_page_initial_content = _wiki_request(params_cat_content)['parse']['text']['*'][:SEARCH_MAIN_ARTICLE_WIN]
-    string_index = cat_page_initial_content.find(MAIN_ARTICLE_STRING)
-    if not string_index == -1:
-        main_page_url_suffix = re.search(r'\"(.+?)\"', cat_page_initial_content[(string_index+len(MAIN_ARTICLE_STRING)):]).group(0)
-        main_page_url = WIKI_PAGE_PREFIX + main_page_url_suffix.strip("\"")
-        return main_page_url
-    else:
-        return -1
+    def search_cat_ID_by_name(self, cat_name):
+        return int(_wiki_search_cat_ID_by_name(cat_name))
 
-class CategoryCrawler(object):
+    def search_url_by_ID(self, page_ID):
+        return _wiki_search_url_by_ID(page_ID)
 
-    def __init__(self, main_portal):
-        # This graph will include all the explored pages
-        self.category_graph = nx.DiGraph()
-        self.category_graph.add_node("root_node")
-        self.main_cat = main_portal
+    def search_info_by_IDs(self, page_IDs):
+        return _wiki_search_info_by_IDs(page_IDs)
 
+    def search_pages_by_titles(self, titles, stop=None):
+        return _wiki_search_pages_by_titles(titles, stop)
 
-    def _get_main_page_from_category(self, category_name):
+    def search_links_by_titles(self, titles, stop=None):
+        return _wiki_search_links_by_titles(titles, stop)
 
-    # Note that the title of the page can be different from the category,
-    # but (in most of the cases), the wikipedia API gets the right page.
-    # in case it doesn't, we raise the error.
+    def search_main_pages_by_IDs(self, cat_IDs):
+        return _wiki_search_main_pages_for_cats(cat_IDs)
 
+    def get_page(self, title):
+        # wikipedia.page and the page properties go through the pooled client and the response cache as well
+        wikipedia = wiki_client.get_wikipedia()
         try:
-            if category_name.startswith('Category:'):
-                wiki_page = wikipedia.page(category_name[len('Category:'):])
-            else:
-                wiki_page = wikipedia.page(category_name)
-        except Exception:
-            raise
-        return  wiki_page
+            with stats.timer('wikipedia.page'):
+                return wikipedia.page(title)
+        except (wikipedia.exceptions.PageError, wikipedia.exceptions.DisambiguationError) as e:
+            raise wiki_backend.PageNotFound(str(e))
+
+class CategoryCrawler(object):
+
+    def __init__(self, main_portal, graph_backend='networkx', backend=None):
+        # This graph will include all the explored pages. The compact backend (see compact_graph.py)
+        # keeps large graphs, e.g. with include_pages=True, in integer arrays
+        if graph_backend == 'compact':
+            self.category_graph = CompactGraph()
+        else:
+            import networkx as nx
+            self.category_graph = nx.DiGraph()
+        self.category_graph.add_node("root_node")
+        self.main_cat = main_portal
+        # Index of the explored categories: page ID -> (node, explored subcategory depth, subcategory members)
+        self.visited_categories = {}
+        # Source of the categories and pages: the MediaWiki API, or a local dump (see wiki_backend.py)
+        self.backend = backend if backend is not None else ApiBackend()
+        # URLs of the main pages of the categories, resolved in batches: page ID -> URL, or None if not found
+        self.main_pages = {}
+
+    def _prefetch_main_pages(self, cat_IDs):
+        '''
+        Resolves in batches the main pages of the given categories that were not resolved yet.
+        '''
+        cat_IDs = [cat_ID for cat_ID in cat_IDs if cat_ID not in self.main_pages]
+        if cat_IDs:
+            self.main_pages.update(self.backend.search_main_pages_by_IDs(cat_IDs))
+
+    def _get_main_page_url(self, category, cat_page_id):
+        cat_ID = self._get_visited_key(category, cat_page_id)
+        if not cat_ID in self.main_pages:
+            self._prefetch_main_pages([cat_ID])
+        return self.main_pages.get(cat_ID)
 
     def get_category_graph(self):
         return self.category_graph
@@ -106,6 +372,7 @@ class CategoryCrawler(object):
     def write_page_text(self, dir, page):
         file_path = dir + "/" + page['title'].replace('/', '') + '.txt'
         if not os.path.isfile(file_path):
+            wikipedia = wiki_client.get_wikipedia()
             try:
                 txt = wikipedia.page(pageid=page['pageid']).content
                 txt_file = open(file_path, "w", encoding="utf-8")
@@ -115,15 +382,103 @@ class CategoryCrawler(object):
             except AttributeError:
                 print
                 'Error on ' + file_path + " " + str(page['pageid'])
-            except PageError:
+            except wikipedia.exceptions.PageError:
                 print
                 "Document " + str(page['pageid']) + " Not found!"
-            except DisambiguationError:
+            except wikipedia.exceptions.DisambiguationError:
                 print
                 "Disambiguation page discarded!"
         return False
 
-    def search_and_store_graph(self, category, cat_page_id='unknown', subcategory_depth=2, max_depth=10, parent_node='root_node', include_pages=False, node_type='url'):
+    def write_corpus(self, dir, workers=DEFAULT_WORKERS, shard_size=1000):
+        '''
+        Corpus version of write_page_text: writes the text of all the pages in the graph to
+        compressed JSONL shards in dir, fetching them concurrently (see corpus_export.export_corpus).
+        :return: number of pages written
+        '''
+        from corpus_export import export_corpus
+        return export_corpus(self.category_graph, dir, workers=workers, shard_size=shard_size)
+
+    def _get_visited_key(self, category, cat_page_id):
+        '''
+        Returns the page ID used to index a category among the visited ones. The ID of the
+        starting category, which is usually unknown, is searched by name.
+        '''
+        if cat_page_id == 'unknown':
+            title = category if category.startswith('Category:') else 'Category:' + category
+            return self.backend.search_cat_ID_by_name(title)
+        return int(cat_page_id)
+
+    def _fetch_category(self, category, cat_page_id, subcategory_depth, include_pages, category_url=None):
+        '''
+        Network part of the exploration of a category: resolves its URL and main page and lists its members.
+        It does not modify the graph, so that it can run in a worker thread.
+        :return: tuple (category URL, main page message, list of page members, list of subcategory members)
+        '''
+        with stats.timer('fetch_category'):
+            if category_url is None:
+                category_url = ("https://en.wikipedia.org/wiki/" + category.replace(" ", "_")) if (cat_page_id == 'unknown') else self.backend.search_url_by_ID(cat_page_id)
+
+            title = category if category.startswith('Category:') else 'Category:' + category
+
+            main_page_url = self._get_main_page_url(category, cat_page_id)
+            main_page_message = ("Main Wiki page: " + main_page_url) if main_page_url is not None else ("Main Wiki page not found for " + category)
+
+            #=========Listing the members of the category: pages and subcategories come back in the same pass====
+            # Check this website for param structure: https://www.mediawiki.org/wiki/API:Categorymembers
+
+            member_types = [member_type for member_type, required in (('page', include_pages == True), ('subcat', subcategory_depth > 0)) if required]
+
+            page_results = []
+            subcat_results = []
+            if member_types:
+                for member in self.backend.iter_category_members(title, cat_page_id, '|'.join(member_types)):
+                    if member['ns'] == CATEGORY_NAMESPACE:
+                        subcat_results.append(member)
+                    else:
+                        page_results.append(member)
+
+            return category_url, main_page_message, page_results, subcat_results
+
+    def _store_category(self, category, cat_page_id, category_url, main_page_message, page_results, subcategory_depth, max_depth, parent_node, node_type):
+        '''
+        Graph part of the exploration of a category: adds the category and its pages to the graph.
+        :return: the node of the category
+        '''
+        with stats.timer('store_category'):
+            # indent based on the depth of the category: visualisation problems may occur if max_depth is not >> subcategory_depth * 2
+            indent = " " * ((max_depth) - (subcategory_depth * 2))
+            logger.info("%s%s URL: %s", indent, category, category_url, extra={'category': category, 'url': category_url, 'depth': subcategory_depth})
+
+            #adding the category to the graph
+            category_node = category_url if node_type == 'url' else category
+
+            self.category_graph.add_node(category_node, attr_dict={'url': category_url, 'title': category, 'id': cat_page_id})
+            self.category_graph.add_edge(parent_node, category_node)
+
+            stats.count('category_nodes')
+            logger.debug('%s', main_page_message, extra={'category': category})
+
+            #=========Adding the pages to the categories, if required (generates a very large graph)====
+
+            for page_result in page_results:
+
+                page_id = page_result['pageid']
+                page_url = page_result['fullurl'] if 'fullurl' in page_result else self.backend.search_url_by_ID(page_id)
+
+                page_title = page_result['title']
+                logger.debug("%s%s URL: %s", indent, page_title, page_url, extra={'page': page_title, 'url': page_url, 'category': category})
+
+                page_node = page_url if node_type == 'url' else page_title
+
+                self.category_graph.add_node(page_node, attr_dict={'url': page_url, 'title': page_title, 'id': page_id, 'categories': page_result['categories']})
+                self.category_graph.add_edge(category_node, page_node)
+
+            stats.count('page_nodes', len(page_results))
+
+            return category_node
+
+    def search_and_store_graph(self, category, cat_page_id='unknown', subcategory_depth=2, max_depth=10, parent_node='root_node', include_pages=False, node_type='url', category_url=None):
         '''
         This function is called recursively to explore the tree of categories from
         Wikipedia.
@@ -133,76 +488,205 @@ class CategoryCrawler(object):
         :param parent_node: parent node in the graph
         :param: include_pages: if True adds also the pages to the graph and not only the categories
         (may result in large graphs)
+        :param category_url: URL of the category page, if already resolved by the caller
         :return: none
         '''
-        category_url = ("https://en.wikipedia.org/wiki/" + category.replace(" ", "_")) if (cat_page_id == 'unknown') else _wiki_search_url_by_ID(cat_page_id)
+        visited_key = self._get_visited_key(category, cat_page_id)
 
-        # indent based on the depth of the category: visualisation problems may occur if max_depth is not >> subcategory_depth * 2
-        print(" " * ((max_depth) - (subcategory_depth * 2)) + category + " URL: " + category_url)
+        if visited_key in self.visited_categories:
+            # the category was already reached from another parent (or through a cycle): only the edge is added
+            new_parent_node, explored_depth, subcat_results = self.visited_categories[visited_key]
+            self.category_graph.add_edge(parent_node, new_parent_node)
+            if subcategory_depth <= explored_depth:
+                return
 
-        #adding the category to the graph
-        category_node = category_url if node_type == 'url' else category
+            # reached again with more depth left: its subtree is explored further, without fetching the category again
+            if subcat_results is None:
+                title = category if category.startswith('Category:') else 'Category:' + category
+                subcat_results = list(self.backend.iter_category_members(title, cat_page_id, 'subcat'))
+        else:
+            category_url, main_page_message, page_results, subcat_results = self._fetch_category(category, cat_page_id, subcategory_depth, include_pages, category_url)
 
-        self.category_graph.add_node(category_node, attr_dict={'url': category_url, 'title': category, 'id': cat_page_id})
-        self.category_graph.add_edge(parent_node, category_node)
+            new_parent_node = self._store_category(category, cat_page_id, category_url, main_page_message, page_results, subcategory_depth, max_depth, parent_node, node_type)
 
-        new_parent_node = category_node
+        self.visited_categories[visited_key] = (new_parent_node, subcategory_depth, subcat_results if subcategory_depth > 0 else None)
 
-        title = category if category.startswith('Category:') else 'Category:' + category
-
-        try:
-            print("Main Wiki page: " + str(self._get_main_page_from_category(category).url))
-        except Exception as e:
-            print(e)
+        #=======Adding and exploring the subcategories===
 
-        #=========Adding the pages to the categories, if required (generates a very large graph)====
-        # Check this website for param structure: https://www.mediawiki.org/wiki/API:Categorymembers
+        self._prefetch_main_pages(subcat_result['pageid'] for subcat_result in subcat_results if subcat_result['pageid'] not in self.visited_categories)
 
-        if include_pages == True:
-            search_params_pages = {
-                'list': 'categorymembers',
-                'cmtype': 'page',
-                'cmprop': 'ids|title',
-                'cmlimit': 500}
+        for subcat_result in subcat_results:
+            self.search_and_store_graph(subcat_result['title'], subcat_result['pageid'], subcategory_depth - 1, max_depth, new_parent_node, include_pages, node_type, subcat_result.get('fullurl'))
 
-            if (cat_page_id=='unknown'):
-                search_params_pages['cmtitle'] = title
-            else:
-                search_params_pages['cmpageid'] = cat_page_id
+    def _append_checkpoint(self, checkpoint_path, record):
+        '''
+        Appends a record to the checkpoint log of the concurrent crawl: the parameters of the crawl first,
+        then one record per batch with the categories fetched. The cost of a checkpoint is that of its batch,
+        not of the whole crawl, and the graph is rebuilt from the log on resume (see _replay_checkpoint).
+        '''
+        with open(checkpoint_path, 'ab') as checkpoint_file:
+            pickle.dump(record, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
 
-            page_results = _wiki_request(search_params_pages)['query']['categorymembers']
+    def _apply_fetched_batch(self, state, entries, max_depth, node_type):
+        '''
+        Stores the categories fetched for a batch of the frontier, and adds their subcategories to the
+        frontier of the next level. The same function replays the checkpoint log on resume, so that the
+        graph, the visited categories and the frontiers are rebuilt exactly as they were.
+        :param entries: list of (visited key, touched timestamp, depth, fetch result), in the order of the frontier
+        '''
+        # the categories are fetched at most once: those reached from several parents get one edge per parent
+        for visited_key, _, level_depth, result in entries:
+            cat, cat_id, _, parents = state['frontier'].pop(visited_key)
+            cat_url, main_page_message, page_results, subcat_results = result
 
-            for page_result in page_results:
+            new_parent_node = self._store_category(cat, cat_id, cat_url, main_page_message, page_results, level_depth, max_depth, parents[0], node_type)
+            for parent in parents[1:]:
+                self.category_graph.add_edge(parent, new_parent_node)
+            self.visited_categories[visited_key] = (new_parent_node, level_depth, subcat_results if level_depth > 0 else None)
 
-                page_id = page_result['pageid']
-                page_url = _wiki_search_url_by_ID(page_id)
+            for subcat_result in subcat_results:
+                subcat_key = subcat_result['pageid']
+                if subcat_key in self.visited_categories:
+                    self.category_graph.add_edge(new_parent_node, self.visited_categories[subcat_key][0])
+                elif subcat_key in state['frontier']:
+                    state['frontier'][subcat_key][3].append(new_parent_node)
+                elif subcat_key in state['next_frontier']:
+                    state['next_frontier'][subcat_key][3].append(new_parent_node)
+                else:
+                    state['next_frontier'][subcat_key] = [subcat_result['title'], subcat_result['pageid'], subcat_result.get('fullurl'), [new_parent_node]]
+
+        if not state['frontier']:
+            state['frontier'], state['next_frontier'] = state['next_frontier'], {}
+            state['depth'] -= 1
+
+    def _fetch_or_reuse_category(self, frontier_item, subcategory_depth, include_pages, previous_fetched, touched):
+        '''
+        Fetches a category of the frontier, unless the snapshot of a previous crawl holds its members
+        and the category page was not touched since then.
+        '''
+        visited_key, (category, cat_page_id, category_url, _) = frontier_item
 
-                page_title = page_result['title']
-                print(" " * ((max_depth) - (subcategory_depth * 2)) + page_title + " URL: " + page_url)
+        if self._is_reusable(visited_key, subcategory_depth, previous_fetched, touched):
+            category_url, main_page_message, page_results, subcat_results = previous_fetched[visited_key][2]
+            return category_url, main_page_message, page_results, (subcat_results if subcategory_depth > 0 else [])
 
-                page_node = page_url if node_type == 'url' else page_title
+        return self._fetch_category(category, cat_page_id, subcategory_depth, include_pages, category_url)
 
-                self.category_graph.add_node(page_node, attr_dict={'url': page_url, 'title': page_title, 'id': page_id})
-                self.category_graph.add_edge(new_parent_node, page_node)
+    def _is_reusable(self, visited_key, subcategory_depth, previous_fetched, touched):
+        '''
+        True if the snapshot of a previous crawl holds the category, explored deep enough, and its page was not touched since then.
+        Adding or removing a member touches the category page, but a member page changing its own categories
+        does not: the categories of the member pages (include_pages) reused from the snapshot can then be
+        outdated, until the category itself is touched or a full crawl is run.
+        '''
+        if visited_key in previous_fetched and touched.get(visited_key) is not None:
+            previous_touched, previous_depth, _ = previous_fetched[visited_key]
+            return previous_touched == touched[visited_key] and (previous_depth > 0 or subcategory_depth == 0)
+        return False
 
-        #=======Adding and exploring the subcategories===
-        if subcategory_depth > 0:
+    def search_and_store_graph_concurrent(self, category, cat_page_id='unknown', subcategory_depth=2, max_depth=10, parent_node='root_node', include_pages=False, node_type='url', workers=DEFAULT_WORKERS,
+                                          checkpoint_path=None, checkpoint_every=CHECKPOINT_EVERY, previous_snapshot=None):
+        '''
+        Concurrent version of search_and_store_graph. The tree is explored level by level, and the
+        categories of each level are fetched by a pool of worker threads. Only the calling thread
+        modifies the graph, which ends up with the same nodes and edges of the recursive search.
+        The request rate towards the API host can be capped with wiki_client.configure(max_rate=...).
+        :param workers: maximum number of categories fetched concurrently
+        :param checkpoint_path: if given, the categories fetched are appended there every checkpoint_every categories,
+        and, if the file already exists, the crawl resumes from it (the other parameters are then taken from the checkpoint)
+        :param previous_snapshot: checkpoint of a completed previous crawl. Only the categories whose page
+        was touched since then are fetched again, the members of the others are taken from the snapshot
+        (see search_and_store_graph for the other parameters)
+        :return: none
+        '''
+        root_key = self._get_visited_key(category, cat_page_id)
+        if root_key in self.visited_categories:
+            self.search_and_store_graph(category, cat_page_id, subcategory_depth, max_depth, parent_node, include_pages, node_type)
+            return
+
+        if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+            state = self._replay_checkpoint(checkpoint_path)
+            max_depth, include_pages, node_type = state['max_depth'], state['include_pages'], state['node_type']
+        else:
+            # frontier of the level and of the next one: page ID -> [category, page ID, URL, parent nodes]
+            state = {'frontier': {root_key: [category, cat_page_id, None, [parent_node]]}, 'next_frontier': {},
+                     'depth': subcategory_depth, 'max_depth': max_depth, 'include_pages': include_pages, 'node_type': node_type}
+            if checkpoint_path is not None:
+                self._append_checkpoint(checkpoint_path, {'category': category, 'cat_page_id': cat_page_id, 'parent_node': parent_node, 'depth': subcategory_depth,
+                                                          'max_depth': max_depth, 'include_pages': include_pages, 'node_type': node_type})
+
+        previous_fetched = {}
+        if previous_snapshot is not None:
+            previous_fetched = read_checkpoint_fetched(previous_snapshot, include_pages)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while state['frontier']:
+                level_depth = state['depth']
+                batch = list(state['frontier'].items())[:checkpoint_every] if checkpoint_path is not None else list(state['frontier'].items())
+
+                # the touched timestamps are stored in the checkpoint, so that the crawl can be the snapshot of an incremental one
+                touched = {}
+                if previous_fetched or checkpoint_path is not None:
+                    touched = dict((page_ID, page.get('touched')) for page_ID, page in self.backend.search_info_by_IDs(visited_key for visited_key, _ in batch).items())
+
+                self._prefetch_main_pages(visited_key for visited_key, _ in batch if not self._is_reusable(visited_key, level_depth, previous_fetched, touched))
+
+                fetched = executor.map(lambda item: self._fetch_or_reuse_category(item, level_depth, include_pages, previous_fetched, touched), batch)
+                entries = [(visited_key, touched.get(visited_key), level_depth, result) for (visited_key, _), result in zip(batch, fetched)]
+
+                if checkpoint_path is not None:
+                    self._append_checkpoint(checkpoint_path, entries)
+                self._apply_fetched_batch(state, entries, max_depth, node_type)
+
+    def _replay_checkpoint(self, checkpoint_path):
+        '''
+        Rebuilds the state of an interrupted concurrent crawl from its checkpoint log, storing again the
+        categories of each logged batch. A batch cut by the interruption is removed from the log.
+        :return: state of the crawl (frontiers, depth and parameters)
+        '''
+        records = _iter_checkpoint_log(checkpoint_path, repair=True)
+        header = next(records)
+        state = {'frontier': {self._get_visited_key(header['category'], header['cat_page_id']): [header['category'], header['cat_page_id'], None, [header['parent_node']]]},
+                 'next_frontier': {}, 'depth': header['depth'], 'max_depth': header['max_depth'],
+                 'include_pages': header['include_pages'], 'node_type': header['node_type']}
+        for entries in records:
+            self._apply_fetched_batch(state, entries, header['max_depth'], header['node_type'])
+        return state
 
-            search_params_subcat = {
-                'list': 'categorymembers',
-                'cmtype': 'subcat',
-                'cmprop': 'ids|title',
-                'cmlimit': 500}
 
-            if (cat_page_id=='unknown'):
-                search_params_subcat['cmtitle'] = title
-            else:
-                search_params_subcat['cmpageid'] = cat_page_id
+def _iter_checkpoint_log(checkpoint_path, repair=False):
+    '''
+    Yields the records of a checkpoint log: the parameters of the crawl, then the batches.
+    :param repair: if True, a last record cut by an interruption is removed from the file, so that new
+    records can be appended; otherwise the log is read up to the last complete record
+    '''
+    size = os.path.getsize(checkpoint_path)
+    with open(checkpoint_path, 'rb') as checkpoint_file:
+        while True:
+            offset = checkpoint_file.tell()
+            if offset == size:
+                break
+            try:
+                record = pickle.load(checkpoint_file)
+            except (EOFError, pickle.UnpicklingError, ValueError, IndexError):
+                logger.warning("Checkpoint %s truncated after %d bytes", checkpoint_path, offset)
+                if repair:
+                    checkpoint_file.close()
+                    os.truncate(checkpoint_path, offset)
+                break
+            yield record
 
-            subcat_results = _wiki_request(search_params_subcat)['query']['categorymembers']
 
-            for subcat_result in subcat_results:
-                self.search_and_store_graph(subcat_result['title'], subcat_result['pageid'], subcategory_depth - 1, max_depth, new_parent_node, include_pages, node_type)
+def read_checkpoint_fetched(checkpoint_path, include_pages):
+    '''
+    Reads the categories fetched by a crawl from its checkpoint log, for an incremental crawl.
+    :return: dictionary visited key -> (touched timestamp, depth, fetch result), empty if the crawl
+    was run with a different include_pages
+    '''
+    records = _iter_checkpoint_log(checkpoint_path)
+    if next(records)['include_pages'] != include_pages:
+        return {}
+    return dict((visited_key, (touched, depth, result)) for entries in records for visited_key, touched, depth, result in entries)
 
 # To visualise the graph and have the links you should:
 # 1. Open the file .gexf with Gephi;
@@ -212,21 +696,49 @@ class CategoryCrawler(object):
 
 #Call e.g.: python wiki_crawler_desira.py "Category:Artificial intelligence" 2, and it will save a gexf file about the
 #Artificial intelligence category, with depth 2.
+#Add e.g. --workers 16 to fetch the categories of each level concurrently, and --max-rate 50 to cap the requests per second.
+#With --checkpoint ai.ckpt the categories fetched are logged periodically, and running the same command again resumes the crawl.
+#A nightly refresh can then run with --incremental ai.ckpt --checkpoint ai_new.ckpt, fetching only the categories changed since.
+#Add --stats-report stats.json for the requests, latencies and timings of the crawl, and --log-level WARNING for a silent crawl.
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Crawl the tree of subcategories of a Wikipedia category and save it as a gexf graph.')
+    parser.add_argument('portal', help='category to crawl, e.g. "Category:Artificial intelligence"')
+    parser.add_argument('subcategory_depth', type=int, help='depth to explore in the tree of subcategories')
+    parser.add_argument('--workers', type=int, default=1, help='number of categories fetched concurrently (1: recursive search)')
+    parser.add_argument('--max-rate', type=float, default=None, help='maximum number of requests per second sent to the API host')
+    parser.add_argument('--checkpoint', default=None, help='file where the categories fetched are logged periodically; the crawl resumes from it if it exists')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY, help='categories stored between two checkpoints')
+    parser.add_argument('--incremental', default=None, help='checkpoint of a completed crawl: only the categories changed since then are fetched again')
+    parser.add_argument('--graph-backend', choices=('networkx', 'compact'), default='networkx', help='in-memory store of the graph')
+    parser.add_argument('--format', choices=GRAPH_FORMATS, default='gexf', help='format of the saved graph')
+    wiki_cache.add_cache_arguments(parser)
+    wiki_backend.add_backend_arguments(parser)
+    crawl_stats.add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.incremental is not None and args.checkpoint is None:
+        parser.error('--incremental requires --checkpoint')
+
+    portal = args.portal
+    subcategory_depth = args.subcategory_depth
+
+    wiki_client.configure(pool_size=max(wiki_client.POOL_SIZE, args.workers), max_rate=args.max_rate, cache=wiki_cache.cache_from_args(args))
+    crawl_stats.setup_from_args(args)
+
+    d = CategoryCrawler(portal, graph_backend=args.graph_backend, backend=wiki_backend.backend_from_args(args))
+    if args.workers > 1 or args.checkpoint is not None:
+        d.search_and_store_graph_concurrent(portal, cat_page_id='unknown', subcategory_depth=subcategory_depth, max_depth=10, parent_node="root_node", include_pages=False, node_type='url', workers=args.workers,
+                                            checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every, previous_snapshot=args.incremental)
+    else:
+        d.search_and_store_graph(portal, cat_page_id='unknown', subcategory_depth = subcategory_depth, max_depth=10, parent_node = "root_node", include_pages=False, node_type='url')
 
-def main():
-    portal = sys.argv[1:][0]
-    subcategory_depth = int(sys.argv[1:][1])
-
-    d = CategoryCrawler(portal)
-    d.search_and_store_graph(portal, cat_page_id='unknown', subcategory_depth = subcategory_depth, max_depth=10, parent_node = "root_node", include_pages=False, node_type='url')
-
-    graph_file_name = portal + '_D' + str(subcategory_depth) + '_category_graph.gexf'
-    nx.write_gexf(d.get_category_graph(), graph_file_name)
-    print('Gephi graph saved in ' + graph_file_name)
+    graph_file_name = portal + '_D' + str(subcategory_depth) + '_category_graph.' + args.format
+    export_graph(d.get_category_graph(), graph_file_name, args.format)
+    print('Graph saved in ' + graph_file_name)
+    crawl_stats.write_from_args(args)
 
 
 
 if __name__ == "__main__":
     main()
-
-